@@ -0,0 +1,62 @@
+import argparse, time
+from features.aesthetic import CLIPAestheticExtractor
+from utils.io import load_images_from_folder
+from utils.logging import get_logger
+from utils.parallel import ClipPool, memory_mb
+
+logger = get_logger(__name__)
+
+def run_pool(aesthetic, paths, args, share):
+    t0 = time.perf_counter()
+    with ClipPool(args.workers, aesthetic, max_side=args.max_side, threads=args.threads,
+                  share=share, chunksize=args.chunksize) as pool:
+        scores = {path: features['aesthetic'] for path, features, error in pool.imap(paths) if error is None}
+        wall = time.perf_counter() - t0
+        info = list(pool.worker_info.values())
+    return scores, wall, info
+
+def report(name, paths, wall, info):
+    startup = [i['startup_s'] for i in info]
+    print(f"{name}: {len(info)} workers, {len(paths) / wall:.1f} images/s, "
+          f"startup mean {sum(startup) / len(startup):.2f} s max {max(startup):.2f} s")
+    for i in sorted(info, key=lambda i: i['pid']):
+        print(f"  pid {i['pid']}: startup {i['startup_s']:.2f} s, init {i['init_s']:.2f} s, "
+              f"rss {i['rss']:.0f} MB" + (f", pss {i['pss']:.0f} MB, shared {i['shared']:.0f} MB" if 'pss' in i else ''))
+    if all('pss' in i for i in info):
+        print(f"  workers total pss {sum(i['pss'] for i in info):.0f} MB")
+
+def main():
+    """
+    Per-worker startup time and memory of ClipPool with the CLIP weights in
+    shared memory versus every worker loading its own model, plus a check
+    that both score every image identically. Every worker must receive a
+    chunk to report, so use at least workers * chunksize images.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=128)
+    parser.add_argument('--chunksize', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=None, help='torch threads per worker')
+    parser.add_argument('--max_side', type=int, default=None)
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    paths = load_images_from_folder(args.input_dir)[:args.limit]
+    before = memory_mb()
+    t0 = time.perf_counter()
+    aesthetic = CLIPAestheticExtractor(device=args.device, max_side=args.max_side)
+    load_s = time.perf_counter() - t0
+    after = memory_mb()
+    print(f"parent: clip.load {load_s:.2f} s, model adds {after['rss'] - before['rss']:.0f} MB rss")
+
+    unshared, wall, info = run_pool(aesthetic, paths, args, share=False)
+    report("per-worker load", paths, wall, info)
+    shared, wall, info = run_pool(aesthetic, paths, args, share=True)
+    report("shared weights", paths, wall, info)
+
+    diff = max((abs(shared[p] - unshared[p]) for p in shared.keys() & unshared.keys()), default=0.0)
+    print(f"scored {len(shared)} / {len(unshared)} images, max aesthetic difference {diff:.2e}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse, time
+import numpy as np
+from features.technical import TechnicalFeatureExtractor
+from ranking.fusion import FeatureFusion
+from evaluation.agreement import spearman, topk_overlap
+from utils.io import load_images_from_folder, load_decoded
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+def run(paths, max_side, technical, aesthetic=None):
+    """Decode + extract every path at one working resolution; returns (decode_s, features)."""
+    decode_s, feature_list = 0.0, []
+    for path in paths:
+        t0 = time.perf_counter()
+        decoded = load_decoded(path, max_side)
+        decoded.gray  # include the gray conversion in decode time
+        decode_s += time.perf_counter() - t0
+        features = technical.extract(decoded)
+        features['aesthetic'] = aesthetic.extract(decoded)['aesthetic'] if aesthetic else 0.0
+        features['path'] = path
+        feature_list.append(features)
+    return decode_s, feature_list
+
+def main():
+    """
+    Decode time and ranking agreement of reduced-resolution decoding versus
+    native decoding on a folder of images.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--max_side', type=int, nargs='+', default=[512, 1024])
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--topk', type=int, default=50)
+    parser.add_argument('--with_clip', action='store_true', help='include the CLIP aesthetic score')
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    paths = load_images_from_folder(args.input_dir)[:args.limit]
+    aesthetic = None
+    if args.with_clip:
+        from features.aesthetic import CLIPAestheticExtractor
+        aesthetic = CLIPAestheticExtractor(device=args.device)
+
+    fusion = FeatureFusion()
+    base_s, base = run(paths, None, TechnicalFeatureExtractor(), aesthetic)
+    base_scores = np.array([fd['final_score'] for fd in fusion.fuse(base)])
+    print(f"{'max_side':>8} {'decode ms/img':>14} {'speedup':>8} {'spearman':>9} {'top-k overlap':>14}")
+    print(f"{'native':>8} {1000 * base_s / len(paths):14.2f} {1.0:8.2f} {1.0:9.4f} {1.0:14.3f}")
+    for max_side in args.max_side:
+        # sharpness is measured at max_side, as run_ranking.py --max_side does
+        s, feats = run(paths, max_side, TechnicalFeatureExtractor(max_side=max_side), aesthetic)
+        scores = np.array([fd['final_score'] for fd in fusion.fuse(feats)])
+        print(f"{max_side:>8} {1000 * s / len(paths):14.2f} {base_s / s:8.2f} "
+              f"{spearman(base_scores, scores):9.4f} {topk_overlap(base_scores, scores, args.topk):14.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+import argparse, time
+import numpy as np
+from ranking.fusion import FeatureFusion
+from ranking.incremental import IncrementalRanker
+from ranking.table import FeatureTable
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+def synthetic_features(rng, n):
+    """Raw feature columns with realistic spreads (heavy-tailed sharpness)."""
+    return {
+        'aesthetic': rng.uniform(0.3, 0.7, n),
+        'sharpness': rng.lognormal(5.0, 1.2, n),
+        'exposure': rng.beta(5, 2, n),
+        'contrast': rng.beta(4, 3, n),
+        'faces': (rng.random(n) < 0.3).astype(np.int64) * rng.integers(1, 4, n)
+    }
+
+def full_refuse(fusion, live):
+    """Baseline: rebuild the table, fuse and stable-sort everything."""
+    paths = list(live)
+    table = FeatureTable({'path': paths, **{k: [live[p][k] for p in paths] for k in live[paths[0]]}})
+    return fusion.fuse_table(table).sort_by('final_score')
+
+def main():
+    """
+    Per-update latency of IncrementalRanker versus a full re-fuse and sort,
+    on synthetic features, with an exactness check against the full re-fuse.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n', type=int, default=100000)
+    parser.add_argument('--ops', type=int, default=2000, help='inserts/removes after the initial load')
+    parser.add_argument('--remove_fraction', type=float, default=0.2)
+    parser.add_argument('--refuse_runs', type=int, default=5)
+    parser.add_argument('--topk', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    total = args.n + args.ops
+    cols = synthetic_features(rng, total)
+    rows = [{k: cols[k][i].item() for k in cols} for i in range(total)]
+    paths = [f"/photos/img_{i:07d}.jpg" for i in range(total)]
+
+    fusion = FeatureFusion()
+    ranker = IncrementalRanker(fusion)
+    t0 = time.perf_counter()
+    ranker.add_many(zip(paths[:args.n], rows[:args.n]))
+    load_s = time.perf_counter() - t0
+    live = dict(zip(paths[:args.n], rows[:args.n]))  # insertion order == ranker tie order
+
+    op_times, query_times, next_new = [], [], args.n
+    for _ in range(args.ops):
+        t0 = time.perf_counter()
+        if rng.random() < args.remove_fraction and live:
+            victim = paths[int(rng.integers(next_new))]
+            if victim in live:
+                ranker.remove(victim)
+                del live[victim]
+        else:
+            ranker.add(paths[next_new], rows[next_new])
+            live[paths[next_new]] = rows[next_new]
+            next_new += 1
+        op_times.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        ranker.topk(args.topk)
+        ranker.rank_of(next(iter(live)))
+        query_times.append(time.perf_counter() - t0)
+
+    refuse_times = []
+    for _ in range(args.refuse_runs):
+        t0 = time.perf_counter()
+        ranked = full_refuse(fusion, live)
+        refuse_times.append(time.perf_counter() - t0)
+
+    op_ms = 1000 * np.array(op_times)
+    refuse_ms = 1000 * np.median(refuse_times)
+    print(f"images: {len(live)}  initial load: {load_s:.2f} s  bound-change rescores: {ranker.rescores}")
+    print(f"incremental update: mean {op_ms.mean():.3f} ms  p50 {np.median(op_ms):.3f} ms  "
+          f"p99 {np.percentile(op_ms, 99):.3f} ms  max {op_ms.max():.1f} ms")
+    print(f"top-{args.topk} + rank_of query: mean {1000 * np.mean(query_times):.3f} ms")
+    print(f"full re-fuse + sort: {refuse_ms:.1f} ms per update -> {refuse_ms / op_ms.mean():.0f}x slower on average")
+
+    top = ranker.topk(len(ranker))
+    same_order = [r['path'] for r in top] == ranked['path'].tolist()
+    same_scores = np.array_equal([r['final_score'] for r in top], ranked['final_score'])
+    print(f"identical to full re-fuse: order {same_order}, scores {same_scores}")
+
+if __name__ == '__main__':
+    main()
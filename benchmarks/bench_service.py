@@ -0,0 +1,57 @@
+import argparse, json, threading, time, urllib.request
+import numpy as np
+from utils.io import load_images_from_folder
+
+def post(url, paths):
+    data = json.dumps({'paths': paths}).encode('utf-8')
+    req = urllib.request.Request(url + '/score', data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+def main():
+    """
+    Latency/throughput client for scripts/serve.py: `concurrency` threads send
+    `requests` requests of `images_per_request` images drawn from input_dir.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--images_per_request', type=int, default=20)
+    args = parser.parse_args()
+
+    paths = load_images_from_folder(args.input_dir)
+    rng = np.random.default_rng(0)
+    jobs = [list(rng.choice(paths, size=args.images_per_request)) for _ in range(args.requests)]
+    latencies, errors, lock = [], [0], threading.Lock()
+
+    def worker(worker_id):
+        for job in jobs[worker_id::args.concurrency]:
+            t0 = time.perf_counter()
+            try:
+                post(args.url, [str(p) for p in job])
+                with lock:
+                    latencies.append(time.perf_counter() - t0)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    post(args.url, [str(paths[0])])  # warm-up
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+
+    lat = np.array(latencies) * 1000
+    print(f"requests={len(lat)} errors={errors[0]} concurrency={args.concurrency} images/request={args.images_per_request}")
+    if len(lat):
+        print(f"latency ms: p50={np.percentile(lat, 50):.1f} p95={np.percentile(lat, 95):.1f} "
+              f"p99={np.percentile(lat, 99):.1f} max={lat.max():.1f}")
+    print(f"throughput: {len(lat) / wall:.2f} req/s, {len(lat) * args.images_per_request / wall:.1f} images/s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import argparse, json, os, platform, resource, sys, tempfile, time
+from benchmarks.synthetic import generate_dataset
+from features.technical import TechnicalFeatureExtractor, gray_stats, exposure_from_mean, contrast_from_std
+from ranking.fusion import FeatureFusion
+from ranking.dedup import Deduplicator
+from ranking.table import FeatureTable
+from evaluation.proxy_metrics import ProxyEvaluator
+from utils.io import load_images_from_folder, load_decoded
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+FIELDNAMES = ['file','path','final_score','aesthetic','sharpness_norm','exposure_norm','contrast_norm','face_present']
+
+def peak_rss_mb():
+    """Peak RSS of the whole process so far (MB); it never decreases."""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024  # bytes on macOS, KiB on Linux
+
+class StageTimer:
+    """
+    Collects wall time and item count per named stage, plus the process peak
+    RSS once the stage has run (cumulative over all stages so far, not the
+    stage's own peak).
+    """
+    def __init__(self):
+        self.results = {}
+
+    def run(self, name, n_items, fn, repeat=1):
+        best = float('inf')
+        out = None
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            best = min(best, time.perf_counter() - t0)
+        self.results[name] = {'seconds': best, 'items': n_items,
+                              'items_per_sec': n_items / best if best > 0 else float('inf'),
+                              'process_peak_rss_mb': peak_rss_mb()}
+        logger.info(f"{name:>20}: {best * 1000:9.1f} ms  {self.results[name]['items_per_sec']:10.1f} items/s")
+        return out
+
+def run_suite(data_dir, repeat=3, with_clip=False, max_side=None):
+    paths = load_images_from_folder(data_dir)
+    n = len(paths)
+    timer = StageTimer()
+
+    decoded = timer.run('decode', n, lambda: [load_decoded(p, max_side) for p in paths])
+    grays = timer.run('gray', n, lambda: [d.gray for d in decoded])
+
+    technical = TechnicalFeatureExtractor(max_side=max_side)
+    # at the sharpness resolution TechnicalFeatureExtractor uses in production
+    stats = timer.run('sharpness_exposure_contrast', n,
+                      lambda: [gray_stats(g, technical.sharpness_side) for g in grays], repeat)
+    timer.run('exposure_contrast_map', n, lambda: (exposure_from_mean([s[1] for s in stats]),
+                                                    contrast_from_std([s[2] for s in stats])), repeat)
+    faces = timer.run('face_detection', n, lambda: [technical._face_count(g) for g in grays])
+    fast = TechnicalFeatureExtractor(max_side=max_side, face_mode='fast')
+    timer.run('face_detection_fast', n, lambda: [fast._face_count(g) for g in grays])
+
+    aesthetic = [0.5] * n
+    if with_clip:
+        from features.aesthetic import CLIPAestheticExtractor
+        clip_extractor = CLIPAestheticExtractor(device='cpu')
+        results = timer.run('clip', n, lambda: clip_extractor.extract_batch(decoded))
+        aesthetic = [r['aesthetic'] if r else 0.0 for r in results]
+
+    rows = [{'path': p, 'file': os.path.basename(p), 'aesthetic': a, 'sharpness': s[0],
+             'exposure': float(exposure_from_mean(s[1])), 'contrast': float(contrast_from_std(s[2])), 'faces': f}
+            for p, a, s, f in zip(paths, aesthetic, stats, faces)]
+    fusion = FeatureFusion()
+    fused = timer.run('fusion', n, lambda: fusion.fuse([dict(r) for r in rows]), repeat)
+    table = FeatureTable.from_dicts(rows)
+    timer.run('fusion_table', n, lambda: fusion.fuse_table(FeatureTable(dict(table.columns))), repeat)
+    ranked = sorted(fused, key=lambda x: x['final_score'], reverse=True)
+
+    dedup = Deduplicator()
+    hashed = timer.run('phash', n, lambda: [dict(r, phash=dedup.hash_image(d)) for r, d in zip(ranked, decoded)])
+    timer.run('dedup', n, lambda: dedup.dedup(hashed), repeat)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, 'ranked.csv')
+        ranked_table = fusion.fuse_table(FeatureTable(dict(table.columns))).sort_by('final_score')
+        timer.run('csv_write', n, lambda: ranked_table.save_csv(csv_path, FIELDNAMES), repeat)
+        evaluator = ProxyEvaluator()
+        timer.run('evaluation', n, lambda: evaluator.evaluate_table(FeatureTable.load_csv(csv_path)), repeat)
+
+    return {'images': n, 'stages': timer.results, 'peak_rss_mb': peak_rss_mb(),
+            'python': platform.python_version(), 'machine': platform.machine()}
+
+def compare(results, baseline, tolerance):
+    """
+    Returns:
+        list of str: stages slower than baseline by more than tolerance (fraction)
+    """
+    regressions = []
+    for name, base in baseline['stages'].items():
+        cur = results['stages'].get(name)
+        if cur is None:
+            continue
+        ratio = base['items_per_sec'] / cur['items_per_sec'] if cur['items_per_sec'] else float('inf')
+        status = 'REGRESSION' if ratio > 1 + tolerance else 'ok'
+        print(f"{name:>28} {base['items_per_sec']:10.1f} -> {cur['items_per_sec']:10.1f} items/s  ({ratio:5.2f}x time)  {status}")
+        if status != 'ok':
+            regressions.append(name)
+    rss_ratio = results['peak_rss_mb'] / baseline['peak_rss_mb']
+    print(f"{'peak_rss_mb':>28} {baseline['peak_rss_mb']:10.1f} -> {results['peak_rss_mb']:10.1f}")
+    if rss_ratio > 1 + tolerance:
+        regressions.append('peak_rss_mb')
+    return regressions
+
+def main():
+    """
+    Per-stage benchmark of the ranking pipeline on a deterministic synthetic
+    dataset. With --baseline, exits non-zero if any stage regressed.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data_dir', default=None, help='existing images; default: generate synthetic ones')
+    parser.add_argument('--n', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max_side', type=int, default=None)
+    parser.add_argument('--with_clip', action='store_true')
+    parser.add_argument('--output', default=None, help='write results JSON here')
+    parser.add_argument('--baseline', default=None, help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown fraction')
+    parser.add_argument('--save_baseline', action='store_true', help='write results to --baseline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir
+        if data_dir is None:
+            data_dir = os.path.join(tmp, 'data')
+            generate_dataset(data_dir, n=args.n, seed=args.seed)
+        results = run_suite(data_dir, repeat=args.repeat, with_clip=args.with_clip, max_side=args.max_side)
+    results['config'] = {'n': args.n, 'seed': args.seed, 'max_side': args.max_side, 'with_clip': args.with_clip}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+    elif args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != results['config']:
+            print(f"warning: baseline config {baseline.get('config')} differs from {results['config']}")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"FAILED: regressions in {', '.join(regressions)}")
+            sys.exit(1)
+        print("No regressions")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import argparse, json, os
+import cv2
+import numpy as np
+from PIL import Image
+
+SIZES = [(640, 480), (1280, 720), (1920, 1080), (4000, 3000)]
+BLUR_SIGMAS = [0.0, 0.0, 1.0, 2.5, 6.0]
+
+def _scene(rng, width, height):
+    """Smooth colour field with a few hard-edged shapes, like a simple photo."""
+    small = (rng.random((12, 16, 3)) * 255).astype(np.uint8)
+    img = cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+    for _ in range(int(rng.integers(3, 9))):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        w, h = int(rng.integers(width // 20, width // 4)), int(rng.integers(height // 20, height // 4))
+        cv2.rectangle(img, (x, y), (x + w, y + h), color, thickness=-1)
+    noise = rng.normal(0, 4, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+def _draw_face(img, rng):
+    """Stylized frontal face; Haar cascades detect some of these, not all."""
+    h, w = img.shape[:2]
+    size = int(rng.integers(min(h, w) // 8, min(h, w) // 3))
+    cx, cy = int(rng.integers(size, w - size)), int(rng.integers(size, h - size))
+    skin = (int(rng.integers(150, 230)), int(rng.integers(120, 190)), int(rng.integers(90, 160)))
+    cv2.ellipse(img, (cx, cy), (int(size * 0.4), int(size * 0.5)), 0, 0, 360, skin, -1)
+    eye_dx, eye_y, eye_r = int(size * 0.15), cy - int(size * 0.1), max(2, size // 20)
+    for ex in (cx - eye_dx, cx + eye_dx):
+        cv2.ellipse(img, (ex, eye_y), (eye_r * 2, eye_r), 0, 0, 360, (40, 30, 30), -1)
+    cv2.line(img, (cx, cy - size // 20), (cx, cy + size // 10), (120, 80, 70), max(1, size // 40))
+    cv2.ellipse(img, (cx, cy + int(size * 0.25)), (int(size * 0.12), max(1, size // 25)), 0, 0, 360, (110, 40, 40), -1)
+
+def generate_dataset(out_dir, n=200, seed=0, dup_fraction=0.15, face_fraction=0.3, sizes=SIZES):
+    """
+    Write a deterministic set of JPEGs covering varied sizes, blur levels,
+    faces and near-duplicates, plus a manifest.json describing each image.
+
+    Returns:
+        list of dict: one entry per image (file, size, blur_sigma, face, duplicate_of)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n_dups = int(n * dup_fraction)
+    manifest = []
+    for i in range(n - n_dups):
+        width, height = sizes[int(rng.integers(len(sizes)))]
+        img = _scene(rng, width, height)
+        face = bool(rng.random() < face_fraction)
+        if face:
+            _draw_face(img, rng)
+        sigma = float(BLUR_SIGMAS[int(rng.integers(len(BLUR_SIGMAS)))])
+        if sigma > 0:
+            img = cv2.GaussianBlur(img, (0, 0), sigma)
+        gain = float(rng.uniform(0.4, 1.4))  # under/over exposure
+        img = np.clip(img.astype(np.float32) * gain, 0, 255).astype(np.uint8)
+        fname = f"img_{i:05d}.jpg"
+        Image.fromarray(img).save(os.path.join(out_dir, fname), quality=90)
+        manifest.append({'file': fname, 'size': [width, height], 'blur_sigma': sigma,
+                         'face': face, 'exposure_gain': gain, 'duplicate_of': None})
+    originals = list(manifest)
+    for j in range(n_dups):
+        src = originals[int(rng.integers(len(originals)))]
+        img = np.asarray(Image.open(os.path.join(out_dir, src['file'])).convert('RGB')).astype(np.int16)
+        img = np.clip(img + int(rng.integers(-8, 9)), 0, 255).astype(np.uint8)
+        fname = f"dup_{j:05d}.jpg"
+        Image.fromarray(img).save(os.path.join(out_dir, fname), quality=int(rng.integers(70, 95)))
+        manifest.append(dict(src, file=fname, duplicate_of=src['file']))
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'seed': seed, 'images': manifest}, f, indent=1)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output_dir', required=True)
+    parser.add_argument('--n', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    manifest = generate_dataset(args.output_dir, args.n, args.seed)
+    print(f"Wrote {len(manifest)} images to {args.output_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -11,3 +11,29 @@ prompts = {
         "an uninteresting, low-quality photo, motion blur, noisy"
     ]
 }
+
+# persistent feature cache (scripts/run_ranking.py --cache)
+feature_cache_path = "./output/cache/features.sqlite"
+feature_cache_max_mb = 512
+
+# CLIP image embeddings for prompt re-scoring (run_ranking.py --store_embeddings)
+embedding_store_dir = "./output/cache/embeddings"
+
+# working resolution: long side (px) images are decoded at; None = native.
+# JPEGs use DCT-scaled (draft) decoding. Sharpness is measured at this long side
+# (features.technical.SHARPNESS_SIDE when None). Keep it fixed across runs you compare.
+working_resolution = None
+
+# face detection: 'exhaustive' (full frame, face count) or 'fast' (downscaled,
+# presence only); compare with scripts/check_face_mode.py
+face_mode = "exhaustive"
+
+# opt-in CPU inference optimizations for CLIP (run_ranking.py --cpu_opt);
+# verify ranking impact with scripts/check_cpu_opt.py
+cpu_inference = {
+    'quantize': True,
+    'channels_last': True,
+    'compile': False,
+    'intra_op_threads': None,
+    'inter_op_threads': None
+}
@@ -0,0 +1,28 @@
+import numpy as np
+
+def rankdata(values):
+    """Average ranks (1-based) of a 1-D array, ties sharing their mean rank."""
+    values = np.asarray(values, dtype=np.float64)
+    order = np.argsort(values, kind='mergesort')
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[order] = np.arange(1, len(values) + 1)
+    # average the ranks of tied values
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return sums[inverse] / counts[inverse]
+
+def spearman(a, b):
+    """Spearman rank correlation of two equally long score arrays."""
+    if len(a) < 2:
+        return 1.0
+    ra, rb = rankdata(a), rankdata(b)
+    return float(np.corrcoef(ra, rb)[0, 1])
+
+def topk_overlap(a, b, k):
+    """Fraction of the top-k (by score) shared by two score arrays over the same items."""
+    k = min(k, len(a))
+    if k == 0:
+        return 1.0
+    top_a = set(np.argsort(-np.asarray(a), kind='mergesort')[:k])
+    top_b = set(np.argsort(-np.asarray(b), kind='mergesort')[:k])
+    return len(top_a & top_b) / k
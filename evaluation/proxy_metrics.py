@@ -1,9 +1,177 @@
+import hashlib
 import numpy as np
 from utils.logging import get_logger
 from evaluation.base import Evaluator
 
 logger = get_logger(__name__)
 
+class FileHashSet:
+    """
+    Compact set of file names for duplicate counting: 64-bit BLAKE2b digests
+    in a sorted uint64 array (8 bytes per distinct name). New hashes are
+    buffered and folded in when the buffer outgrows the array, so inserts are
+    amortized O(log n). Collisions are negligible below billions of names.
+    """
+    def __init__(self, hashes=None):
+        self._sorted = np.unique(np.asarray(hashes if hashes is not None else [], dtype=np.uint64))
+        self._pending = []
+        self._pending_len = 0
+
+    @staticmethod
+    def digest(names):
+        return np.array([int.from_bytes(hashlib.blake2b(str(n).encode('utf-8'), digest_size=8).digest(), 'little')
+                         for n in names], dtype=np.uint64)
+
+    def add(self, names):
+        hashes = self.digest(names)
+        self._pending.append(hashes)
+        self._pending_len += len(hashes)
+        if self._pending_len > max(len(self._sorted), 65536):
+            self._compact()
+
+    def _compact(self):
+        if self._pending:
+            self._sorted = np.unique(np.concatenate([self._sorted] + self._pending))
+            self._pending, self._pending_len = [], 0
+
+    def hashes(self):
+        self._compact()
+        return self._sorted
+
+    def __len__(self):
+        return len(self.hashes())
+
+    def union(self, other):
+        return FileHashSet(np.concatenate([self.hashes(), other.hashes()]))
+
+class ProxyAccumulator:
+    """
+    Streaming, mergeable state for ProxyEvaluator's metrics.
+
+    Score variance and the sharpness/aesthetic correlation use Welford-style
+    running means and co-moments, combined per chunk with Chan's parallel
+    update, so chunks and shards can be folded in any order. Duplicates are
+    counted with a FileHashSet.
+
+    With bootstrap=B, B Poisson(1)-weighted replicates of the same moments
+    are kept alongside (the Poisson bootstrap), which gives confidence
+    intervals without holding or resampling the rows. Give each shard its
+    own seed so their replicate weights are independent.
+
+    Args:
+        bootstrap (int): number of bootstrap replicates (0 = none)
+        seed (int): RNG seed for the replicate weights
+    """
+    # columns of the moment state, one row per replicate (row 0 = the data itself)
+    FIELDS = ['n', 'mean_score', 'mean_sharp', 'mean_aest', 'm2_score', 'm2_sharp', 'm2_aest', 'c_sharp_aest']
+    _BLOCK_CELLS = 4_000_000  # replicate x row weights materialized at a time
+
+    def __init__(self, bootstrap=0, seed=0):
+        self.bootstrap = bootstrap
+        self.seed = seed
+        self.rows = 0
+        self.moments = np.zeros((1 + bootstrap, len(self.FIELDS)))
+        self.files = FileHashSet()
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, chunk):
+        """
+        Fold in ranked rows.
+
+        Args:
+            chunk (FeatureTable or dict): columns 'final_score', 'sharpness_norm',
+                'aesthetic' and 'file'
+        """
+        score = np.asarray(chunk['final_score'], dtype=np.float64)
+        sharp = np.asarray(chunk['sharpness_norm'], dtype=np.float64)
+        aest = np.asarray(chunk['aesthetic'], dtype=np.float64)
+        self.files.add(np.asarray(chunk['file']).tolist())
+        self.rows += len(score)
+        block = max(1, self._BLOCK_CELLS // len(self.moments))
+        for start in range(0, len(score), block):
+            cols = [score[start:start + block], sharp[start:start + block], aest[start:start + block]]
+            weights = np.ones((1, len(cols[0])))
+            if self.bootstrap:
+                weights = np.vstack([weights, self._rng.poisson(1.0, (self.bootstrap, len(cols[0])))])
+            self.moments = self._combine(self.moments, self._chunk_moments(weights, cols))
+        return self
+
+    @staticmethod
+    def _chunk_moments(weights, cols):
+        n = weights.sum(axis=1)
+        safe = np.where(n > 0, n, 1)
+        means = [weights @ c / safe for c in cols]
+        devs = [c[None, :] - m[:, None] for c, m in zip(cols, means)]
+        m2 = [(weights * d * d).sum(axis=1) for d in devs]
+        cov = (weights * devs[1] * devs[2]).sum(axis=1)
+        return np.column_stack([n] + means + m2 + [cov])
+
+    @staticmethod
+    def _combine(a, b):
+        """Chan et al. pairwise update of two moment states."""
+        na, nb = a[:, 0], b[:, 0]
+        n = na + nb
+        safe = np.where(n > 0, n, 1)
+        delta = b[:, 1:4] - a[:, 1:4]
+        means = a[:, 1:4] + delta * (nb / safe)[:, None]
+        cross = (na * nb / safe)[:, None]
+        m2 = a[:, 4:7] + b[:, 4:7] + delta ** 2 * cross
+        cov = a[:, 7] + b[:, 7] + delta[:, 1] * delta[:, 2] * cross[:, 0]
+        return np.column_stack([n, means, m2, cov])
+
+    def merge(self, other):
+        """Combine with the state of another chunk stream or shard."""
+        if other.bootstrap != self.bootstrap:
+            raise ValueError(f"Cannot merge {self.bootstrap} and {other.bootstrap} bootstrap replicates")
+        merged = ProxyAccumulator(self.bootstrap, self.seed)
+        merged.rows = self.rows + other.rows
+        merged.moments = self._combine(self.moments, other.moments)
+        merged.files = self.files.union(other.files)
+        return merged
+
+    @staticmethod
+    def _metrics(m):
+        n = m[:, 0]
+        safe = np.where(n > 0, n, 1)
+        score_std = np.sqrt(np.maximum(m[:, 4], 0) / safe)
+        denom = np.sqrt(m[:, 5] * m[:, 6])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.where(n > 1, m[:, 7] / denom, 0.0)
+        return score_std, corr
+
+    def result(self, confidence=0.95):
+        """
+        Returns:
+            dict: {'score_std', 'duplicate_fraction', 'sharpness_corr'}, plus
+            'score_std_ci' and 'sharpness_corr_ci' ([low, high]) with bootstrap
+        """
+        score_std, corr = self._metrics(self.moments)
+        out = {
+            'score_std': float(score_std[0]),
+            'duplicate_fraction': (self.rows - len(self.files)) / max(self.rows, 1),
+            'sharpness_corr': float(corr[0])
+        }
+        if self.bootstrap:
+            tail = 100 * (1 - confidence) / 2
+            for name, values in (('score_std', score_std[1:]), ('sharpness_corr', corr[1:])):
+                lo, hi = np.nanpercentile(values, [tail, 100 - tail])
+                out[f"{name}_ci"] = [float(lo), float(hi)]
+        return out
+
+    def save(self, path):
+        np.savez(path, moments=self.moments, hashes=self.files.hashes(),
+                 meta=np.array([self.bootstrap, self.seed, self.rows], dtype=np.int64))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            bootstrap, seed, rows = (int(x) for x in data['meta'])
+            acc = cls(bootstrap, seed)
+            acc.rows = rows
+            acc.moments = data['moments']
+            acc.files = FileHashSet(data['hashes'])
+        return acc
+
 class ProxyEvaluator(Evaluator):
     """
     Unsupervised evaluation using proxy metrics:
@@ -50,3 +218,78 @@ class ProxyEvaluator(Evaluator):
         except Exception as e:
             logger.exception("Proxy evaluation failed")
             return {}
+
+    def evaluate_table(self, table):
+        """
+        Vectorized evaluate() over a FeatureTable.
+
+        Args:
+            table (FeatureTable): ranked images
+
+        Returns:
+            dict: {'score_std':..., 'duplicate_fraction':..., 'sharpness_corr':...}
+        """
+        try:
+            n = len(table)
+            score_std = float(np.std(table['final_score']))
+            duplicate_fraction = (n - len(np.unique(table['file']))) / max(n, 1)
+            sharpness_corr = float(np.corrcoef(table['sharpness_norm'], table['aesthetic'])[0,1]) if n>1 else 0.0
+
+            logger.info(f"Proxy evaluation: score_std={score_std:.4f}, duplicate_fraction={duplicate_fraction:.4f}, sharpness_corr={sharpness_corr:.4f}")
+            return {
+                'score_std': score_std,
+                'duplicate_fraction': duplicate_fraction,
+                'sharpness_corr': sharpness_corr
+            }
+        except Exception as e:
+            logger.exception("Proxy evaluation failed")
+            return {}
+
+    def evaluate_matrix(self, scores, ranked_list):
+        """
+        Vectorized proxy metrics for many candidate scorings of the same images.
+
+        Args:
+            scores (np.ndarray): (images x candidates) final scores, one column per candidate
+            ranked_list (list of dict): the images, for 'file', 'sharpness_norm', 'aesthetic'
+
+        Returns:
+            dict: metric name -> (candidates,) array
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        n_images, n_candidates = scores.shape
+        score_std = scores.std(axis=0)
+
+        # duplicate fraction and sharpness/aesthetic correlation do not depend on the
+        # weights, so they are computed once and broadcast across candidates
+        files = [img['file'] for img in ranked_list]
+        duplicate_fraction = (len(files) - len(set(files))) / max(len(files), 1)
+        sharpness = np.array([img['sharpness_norm'] for img in ranked_list])
+        aesthetic = np.array([img['aesthetic'] for img in ranked_list])
+        sharpness_corr = float(np.corrcoef(sharpness, aesthetic)[0,1]) if n_images>1 else 0.0
+
+        return {
+            'score_std': score_std,
+            'duplicate_fraction': np.full(n_candidates, duplicate_fraction),
+            'sharpness_corr': np.full(n_candidates, sharpness_corr)
+        }
+
+    def evaluate_stream(self, chunks, bootstrap=0, seed=0, confidence=0.95):
+        """
+        evaluate_table() over an iterable of ranked chunks (e.g.
+        FeatureTable.iter_chunks) without holding the ranking in memory.
+
+        Args:
+            chunks (iterable): FeatureTables or column dicts
+            bootstrap (int): Poisson bootstrap replicates for confidence intervals
+            seed (int): bootstrap RNG seed
+
+        Returns:
+            tuple: (metrics dict, ProxyAccumulator) so shard states can be merged
+        """
+        acc = ProxyAccumulator(bootstrap, seed)
+        for chunk in chunks:
+            acc.update(chunk)
+        metrics = acc.result(confidence)
+        logger.info(f"Proxy evaluation: score_std={metrics['score_std']:.4f}, duplicate_fraction={metrics['duplicate_fraction']:.4f}, sharpness_corr={metrics['sharpness_corr']:.4f}")
+        return metrics, acc
@@ -1,7 +1,12 @@
 import matplotlib.pyplot as plt
 from utils.logging import get_logger
+from utils.io import load_image_pil, is_archive_ref
 import os
-from PIL import Image
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageDraw
+from ranking.table import FeatureTable
 
 logger = get_logger(__name__)
 
@@ -10,7 +15,10 @@ def plot_score_distribution(ranked_list, output_path='./results/score_hist.png')
     Plot histogram of final scores
     """
     try:
-        scores = [img['final_score'] for img in ranked_list]
+        if isinstance(ranked_list, FeatureTable):
+            scores = ranked_list['final_score']
+        else:
+            scores = [img['final_score'] for img in ranked_list]
         plt.figure(figsize=(6,4))
         plt.hist(scores, bins=20, color='skyblue', edgecolor='black')
         plt.xlabel('Final Score')
@@ -23,16 +31,126 @@ def plot_score_distribution(ranked_list, output_path='./results/score_hist.png')
     except Exception as e:
         logger.exception("Failed to plot score distribution")
 
+def link_or_copy(src, dst):
+    """Hardlink src to dst, falling back to a copy across filesystems."""
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def write_replacing(dst, write):
+    """
+    Call write(f) on a temp file next to dst and rename it onto dst, so an
+    existing dst (e.g. a hardlink to an original from an earlier export) is
+    replaced rather than written through.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dst) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, dst)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def _export_one(src, dst, max_side, quality):
+    if max_side:
+        image = load_image_pil(src, max_side)
+        write_replacing(dst, lambda f: image.save(f, 'JPEG', quality=quality))
+    elif is_archive_ref(src):
+        from utils.archive import read_member
+        data = read_member(src)
+        write_replacing(dst, lambda f: f.write(data))
+    else:
+        link_or_copy(src, dst)
+    return dst
+
+def export_topk(ranked_list, k=50, save_dir='./output/topk_images', max_side=512, workers=8, quality=85):
+    """
+    Write the top-K images for review, in parallel.
+
+    Args:
+        ranked_list (list of dict or FeatureTable): ranked rows with 'path' and 'file'
+        k (int): number of images
+        save_dir (str): output folder; files are prefixed with their rank
+        max_side (int): bounded JPEG thumbnails of this long side, decoded with
+            JPEG draft scaling; None hardlinks (or copies) the originals, or
+            extracts them from their archive shard
+        workers (int): threads
+        quality (int): thumbnail JPEG quality
+
+    Returns:
+        list: written path per exported image, None where it failed
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    rows = list(ranked_list.head(k) if isinstance(ranked_list, FeatureTable) else ranked_list[:k])
+    width = max(2, len(str(len(rows))))
+    jobs = []
+    for i, img in enumerate(rows, 1):
+        name = img['file'] if not max_side else os.path.splitext(img['file'])[0] + '.jpg'
+        jobs.append((img['path'], os.path.join(save_dir, f"{i:0{width}d}_{name}")))
+
+    def run(job):
+        try:
+            return _export_one(job[0], job[1], max_side, quality)
+        except Exception as e:
+            logger.error(f"Failed to export {job[0]}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        written = list(pool.map(run, jobs))
+    logger.info(f"Saved {sum(w is not None for w in written)} of top-{len(rows)} images to {save_dir}")
+    return written
+
+def _tile(img, rank, tile, label_h):
+    """One contact-sheet cell: thumbnail centred above a rank/score label."""
+    cell = Image.new('RGB', (tile, tile + label_h), (32, 32, 32))
+    try:
+        thumb = load_image_pil(img['path'], tile)
+        cell.paste(thumb, ((tile - thumb.width) // 2, (tile - thumb.height) // 2))
+    except Exception as e:
+        logger.error(f"Failed to load {img['path']} for the contact sheet: {e}")
+    draw = ImageDraw.Draw(cell)
+    draw.text((4, tile + 2), f"#{rank} {img['final_score']:.3f}", fill=(255, 255, 255))
+    draw.text((4, tile + 2 + label_h // 2), img['file'][:tile // 7], fill=(170, 170, 170))
+    return cell
+
+def contact_sheets(ranked_list, k=500, save_dir='./output/topk_images', cols=10, rows=10,
+                   tile=192, workers=8, quality=85):
+    """
+    Tile the top-K images into contact sheets with rank and score overlays,
+    cols x rows thumbnails per sheet (contact_001.jpg, contact_002.jpg, ...).
+
+    Returns:
+        list of str: sheet paths
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    images = list(ranked_list.head(k) if isinstance(ranked_list, FeatureTable) else ranked_list[:k])
+    label_h = 28
+    per_sheet = cols * rows
+    sheets = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for start in range(0, len(images), per_sheet):
+            batch = images[start:start + per_sheet]
+            cells = pool.map(lambda a: _tile(a[1], start + a[0] + 1, tile, label_h), enumerate(batch))
+            n_rows = (len(batch) + cols - 1) // cols
+            sheet = Image.new('RGB', (cols * tile, n_rows * (tile + label_h)), (0, 0, 0))
+            for j, cell in enumerate(cells):
+                sheet.paste(cell, ((j % cols) * tile, (j // cols) * (tile + label_h)))
+            path = os.path.join(save_dir, f"contact_{len(sheets) + 1:03d}.jpg")
+            write_replacing(path, lambda f: sheet.save(f, 'JPEG', quality=quality))
+            sheets.append(path)
+    logger.info(f"Saved {len(sheets)} contact sheets for top-{len(images)} images to {save_dir}")
+    return sheets
+
 def show_topk_images(ranked_list, k=5, save_dir='./output/topk_images'):
     """
-    Save top-K images to a folder for visual inspection
+    Save top-K images to a folder for visual inspection (hardlinks or copies
+    of the originals; see export_topk for bounded thumbnails)
     """
     try:
-        os.makedirs(save_dir, exist_ok=True)
-        for i, img in enumerate(ranked_list[:k],1):
-            pil_img = Image.open(img['path']).convert('RGB')
-            save_path = os.path.join(save_dir, f"{i:02d}_{img['file']}")
-            pil_img.save(save_path)
-        logger.info(f"Saved top-{k} images to {save_dir}")
+        export_topk(ranked_list, k=k, save_dir=save_dir, max_side=None)
     except Exception as e:
         logger.exception("Failed to save top-K images")
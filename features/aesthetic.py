@@ -1,9 +1,11 @@
 import clip
 import torch
-import math
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from config.config import prompts
 from .base import FeatureExtractor
-from utils.io import load_image_pil
+from .cpu_opt import configure_threads, optimize_clip_for_cpu, inference_context
+from utils.io import image_path
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
@@ -16,14 +18,43 @@ class CLIPAestheticExtractor(FeatureExtractor):
     Returns:
         dict: {'aesthetic': float in 0..1}
     """
-    def __init__(self, device='cpu'):
+    VERSION = 1
+    metrics_name = 'clip'
+
+    def __init__(self, device='cpu', model_name='ViT-B/32', embedding_store=None, max_side=None,
+                 cpu_opt=None):
+        """
+        Args:
+            device (str): 'cpu' or 'cuda'
+            model_name (str): CLIP model to load
+            embedding_store (EmbeddingStore): optional store that receives the
+                normalized image embedding of every scored image
+            max_side (int): working resolution for decoding paths (None = native)
+            cpu_opt (dict): opt-in CPU inference optimizations (see
+                features.cpu_opt.DEFAULT_CPU_OPT); scores shift slightly, so
+                check them with scripts/check_cpu_opt.py
+        """
         self.device = device
-        self.model, self.preprocess = clip.load('ViT-B/32', device=device)
+        self.max_side = max_side
+        self.model_name = model_name
+        self.embedding_store = embedding_store
+        self.cpu_opt = cpu_opt
+        if cpu_opt is not None:
+            configure_threads(cpu_opt.get('intra_op_threads'), cpu_opt.get('inter_op_threads'))
+        self.model, self.preprocess = clip.load(model_name, device=device)
+        if cpu_opt is not None:
+            self.model = optimize_clip_for_cpu(self.model, cpu_opt)
         self.pos_prompts = prompts['positive']
         self.neg_prompts = prompts['negative']
 
         self._init_text_features()
 
+    def cache_key(self):
+        """Everything that changes the aesthetic score, for feature caches."""
+        return {'extractor': 'clip_aesthetic', 'version': self.VERSION, 'model': self.model_name,
+                'positive': list(self.pos_prompts), 'negative': list(self.neg_prompts),
+                'cpu_opt': self.cpu_opt}
+
     def _init_text_features(self):
         """Initialize and normalize text embeddings for positive/negative prompts."""
         try:
@@ -36,17 +67,118 @@ class CLIPAestheticExtractor(FeatureExtractor):
                 self.neg_text = neg_feats.mean(dim=0, keepdim=True)
                 self.pos_text /= self.pos_text.norm(dim=-1, keepdim=True)
                 self.neg_text /= self.neg_text.norm(dim=-1, keepdim=True)
+                # (2, D): row 0 positive, row 1 negative, scored with one matmul
+                self.text_features = torch.cat([self.pos_text, self.neg_text], dim=0)
             logger.info("CLIP text features initialized.")
         except Exception as e:
             logger.exception("Failed to initialize CLIP text features.")
             raise RuntimeError(f"Failed to initialize CLIP text features: {e}")
 
-    def extract(self, image_path):
+    def share_memory(self):
+        """
+        Move the model parameters and the text features into shared memory,
+        so processes started with torch.multiprocessing (see
+        utils.parallel.ClipPool) map this one copy instead of loading their
+        own. Packed int8 weights from cpu_opt quantization are not tensors
+        and are still copied per process.
+
+        Returns:
+            CLIPAestheticExtractor: self
+        """
+        self.model.share_memory()
+        for tensor in (self.pos_text, self.neg_text, self.text_features):
+            tensor.share_memory_()
+        return self
+
+    def score_embeddings(self, img_feat):
+        """
+        Aesthetic scores from normalized image embeddings.
+
+        Args:
+            img_feat (torch.Tensor): (N, D) normalized embeddings.
+
+        Returns:
+            torch.Tensor: (N,) scores in 0..1
+        """
+        sims = img_feat.float() @ self.text_features.T
+        return torch.sigmoid(5 * (sims[:, 0] - sims[:, 1]))
+
+    def score_tensors(self, image_tensor, paths=None):
+        """
+        Score a stack of preprocessed images.
+
+        Args:
+            image_tensor (torch.Tensor): (N, 3, H, W) preprocessed batch.
+            paths (list of str): image paths, required to fill the embedding store.
+
+        Returns:
+            list of float: aesthetic score in 0..1 per image.
+        """
+        with self.stage('encode'):
+            return self._score_tensors(image_tensor, paths)
+
+    def _score_tensors(self, image_tensor, paths):
+        image_tensor = image_tensor.to(self.device)
+        if self.cpu_opt is not None and self.cpu_opt.get('channels_last'):
+            image_tensor = image_tensor.contiguous(memory_format=torch.channels_last)
+        with inference_context():
+            img_feat = self.model.encode_image(image_tensor).float()
+            img_feat /= img_feat.norm(dim=-1, keepdim=True)
+            mapped = self.score_embeddings(img_feat)
+        if self.embedding_store is not None and paths is not None:
+            self.embedding_store.put(paths, img_feat.cpu().numpy())
+        return mapped.cpu().tolist()
+
+    def score_preprocessed(self, arrays, paths=None):
+        """
+        Score images preprocessed elsewhere (e.g. in worker processes).
+
+        Args:
+            arrays (list of np.ndarray): (3, H, W) outputs of self.preprocess
+            paths (list of str): image paths, required to fill the embedding store.
+
+        Returns:
+            list of float: aesthetic score in 0..1 per image.
+        """
+        return self.score_tensors(torch.stack([torch.as_tensor(a) for a in arrays]), paths)
+
+    def rescore_store(self, store, chunk_rows=65536):
+        """
+        Recompute aesthetic scores for every embedding in a store against the
+        current prompts, without running the image encoder.
+
+        Args:
+            store (EmbeddingStore): stored normalized image embeddings
+            chunk_rows (int): rows converted to float32 at a time
+
+        Returns:
+            dict: path -> aesthetic score in 0..1, for embeddings whose image
+            is unchanged since it was encoded
+        """
+        paths, matrix = store.rows()
+        scores = []
+        with torch.no_grad():
+            for start in range(0, len(paths), chunk_rows):
+                block = torch.from_numpy(matrix[start:start + chunk_rows].astype('float32')).to(self.device)
+                scores.extend(self.score_embeddings(block).cpu().tolist())
+        return {p: s for p, s in zip(paths, scores) if p is not None}
+
+    def encoder_config(self):
+        """Settings besides the model that change image embeddings, for EmbeddingStore."""
+        cpu_opt = self.cpu_opt and {k: v for k, v in self.cpu_opt.items() if not k.endswith('_threads')}
+        return {'max_side': self.max_side, 'cpu_opt': cpu_opt}
+
+    def _decode_and_preprocess(self, image):
+        decoded = self.decode(image)
+        with self.stage('preprocess'):
+            return decoded, self.preprocess(decoded.pil)
+
+    def extract(self, image):
         """
         Compute aesthetic score for a single image.
 
         Args:
-            image_path (str): Path to the image.
+            image (str or DecodedImage): Path to the image or shared decoded image.
 
         Returns:
             dict: {'aesthetic': float}
@@ -55,16 +187,75 @@ class CLIPAestheticExtractor(FeatureExtractor):
             RuntimeError on failure.
         """
         try:
-            pil_image = load_image_pil(image_path)
-            image_tensor = self.preprocess(pil_image).unsqueeze(0).to(self.device)
-            with torch.no_grad():
-                img_feat = self.model.encode_image(image_tensor).float()
-                img_feat /= img_feat.norm(dim=-1, keepdim=True)
-                pos_sim = (img_feat @ self.pos_text.T).squeeze().item()
-                neg_sim = (img_feat @ self.neg_text.T).squeeze().item()
-                score = pos_sim - neg_sim
-                mapped = 1 / (1 + math.exp(-5 * score))
-                return {'aesthetic': float(mapped)}
+            _, image_tensor = self._decode_and_preprocess(image)
+            image_tensor = image_tensor.unsqueeze(0)
+            return {'aesthetic': float(self.score_tensors(image_tensor, [image_path(image)])[0])}
         except Exception as e:
-            logger.exception(f"Failed to extract aesthetic for {image_path}")
-            raise RuntimeError(f"Failed to extract CLIP aesthetic for {image_path}: {e}")
+            self.count_failure()
+            logger.exception(f"Failed to extract aesthetic for {image_path(image)}")
+            raise RuntimeError(f"Failed to extract CLIP aesthetic for {image_path(image)}: {e}")
+
+    def iter_batches(self, images, batch_size=32, num_workers=4):
+        """
+        Score images batch by batch.
+
+        Images are decoded and preprocessed on a thread pool one batch ahead
+        of the model, stacked, and scored with a single forward pass per batch.
+
+        Args:
+            images (iterable): Paths, DecodedImage or ImageBuffer objects;
+                consumed lazily, one batch ahead.
+            batch_size (int): Images per forward pass.
+            num_workers (int): Preprocessing threads.
+
+        Yields:
+            tuple: (batch_images, results). batch_images holds the DecodedImage for
+            each input (or the input itself if it could not be decoded) so other
+            extractors can reuse it; results holds {'aesthetic': float} per image,
+            or None where the image could not be scored (the failure is logged).
+        """
+        images = iter(images)
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as pool:
+            submit = lambda batch: [pool.submit(self._decode_and_preprocess, p) for p in batch]
+            next_batch = list(islice(images, batch_size))
+            pending = submit(next_batch)
+            while next_batch:
+                batch, futures = next_batch, pending
+                # prefetch the next batch while this one runs through the model
+                next_batch = list(islice(images, batch_size))
+                pending = submit(next_batch)
+
+                tensors, slots = [], []
+                decoded = list(batch)
+                results = [None] * len(batch)
+                for j, (image, fut) in enumerate(zip(batch, futures)):
+                    try:
+                        decoded[j], tensor = fut.result()
+                        tensors.append(tensor)
+                        slots.append(j)
+                    except Exception as e:
+                        self.count_failure()
+                        logger.error(f"Failed to preprocess {image_path(image)} for CLIP aesthetic: {e}")
+
+                if tensors:
+                    try:
+                        scores = self.score_tensors(torch.stack(tensors),
+                                                    [image_path(decoded[j]) for j in slots])
+                        for j, score in zip(slots, scores):
+                            results[j] = {'aesthetic': float(score)}
+                    except Exception as e:
+                        self.count_failure(len(tensors))
+                        logger.exception(f"Failed to score CLIP batch starting at {image_path(batch[0])}: {e}")
+                yield decoded, results
+
+    def extract_batch(self, images, batch_size=32, num_workers=4):
+        """
+        Compute aesthetic scores for many images (see iter_batches).
+
+        Returns:
+            list: {'aesthetic': float} or None per input image, in input order.
+        """
+        results = []
+        for _, batch_results in self.iter_batches(images, batch_size, num_workers):
+            results.extend(batch_results)
+        return results
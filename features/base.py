@@ -1,10 +1,36 @@
 from abc import ABC, abstractmethod
+from utils.io import DecodedImage, load_decoded
+from utils.metrics import METRICS
 
 class FeatureExtractor(ABC):
     """
     Abstract base class for feature extractors.
-    All extractors must implement extract(image_path) -> dict
+    All extractors must implement extract(image) -> dict, where image is either
+    a path or a utils.io.DecodedImage shared with the other extractors.
+
+    Paths are decoded at the working resolution max_side (long side in pixels,
+    None = native); subclasses set it in their constructor.
+
+    Stage latencies and failures are recorded in utils.metrics.METRICS under
+    '<metrics_name>.<stage>'.
     """
+    max_side = None
+    metrics_name = 'extractor'
+
     @abstractmethod
-    def extract(self, image_path):
-        pass
\ No newline at end of file
+    def extract(self, image):
+        pass
+
+    def decode(self, image):
+        """Decode a path, or pass through an already decoded image."""
+        if isinstance(image, DecodedImage):
+            return image
+        with METRICS.timer('decode'):
+            return load_decoded(image, self.max_side)
+
+    def stage(self, name):
+        """Context manager timing one stage of this extractor."""
+        return METRICS.timer(f"{self.metrics_name}.{name}")
+
+    def count_failure(self, n=1):
+        METRICS.inc(f"{self.metrics_name}.failures", n)
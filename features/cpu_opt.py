@@ -0,0 +1,57 @@
+import torch
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CPU_OPT = {
+    'quantize': True,         # dynamic int8 for the visual encoder's nn.Linear layers
+    'channels_last': True,    # NHWC for the patch-embedding convolution
+    'compile': False,         # torch.compile the visual encoder (torch >= 2.0)
+    'intra_op_threads': None, # torch.set_num_threads; None = torch default
+    'inter_op_threads': None  # torch.set_num_interop_threads; None = torch default
+}
+
+def configure_threads(intra_op_threads=None, inter_op_threads=None):
+    """Set torch CPU thread pools. Inter-op threads can only be set before any parallel work."""
+    if intra_op_threads:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            logger.warning(f"Could not set inter-op threads: {e}")
+    logger.info(f"torch threads: intra_op={torch.get_num_threads()} inter_op={torch.get_num_interop_threads()}")
+
+def optimize_clip_for_cpu(model, options=None):
+    """
+    Apply CPU inference optimizations to a loaded CLIP model in place.
+
+    Args:
+        model: CLIP model from clip.load on CPU (fp32)
+        options (dict): overrides for DEFAULT_CPU_OPT
+
+    Returns:
+        model: the optimized model
+    """
+    opts = dict(DEFAULT_CPU_OPT, **(options or {}))
+    model.eval()
+    if opts['quantize']:
+        quantize_dynamic = getattr(getattr(torch, 'ao', torch), 'quantization', torch.quantization).quantize_dynamic
+        model.visual = quantize_dynamic(model.visual, {torch.nn.Linear}, dtype=torch.qint8)
+        logger.info("Visual encoder linear layers quantized to int8")
+    if opts['channels_last']:
+        model.visual.conv1.to(memory_format=torch.channels_last)
+    if opts['compile']:
+        if hasattr(torch, 'compile'):
+            try:
+                model.visual = torch.compile(model.visual)
+                logger.info("Visual encoder compiled with torch.compile")
+            except Exception as e:
+                logger.warning(f"torch.compile unavailable, running eagerly: {e}")
+        else:
+            logger.warning("torch.compile needs torch >= 2.0, running eagerly")
+    return model
+
+def inference_context():
+    """torch.inference_mode where available, else no_grad."""
+    return torch.inference_mode() if hasattr(torch, 'inference_mode') else torch.no_grad()
@@ -0,0 +1,132 @@
+import json
+import os
+import numpy as np
+from utils.io import ARCHIVE_SEP, is_archive_ref
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+def file_stamp(path):
+    """[size, mtime_ns] of an image file (of its shard for archive refs), [None, None] if it is gone."""
+    try:
+        st = os.stat(path.split(ARCHIVE_SEP, 1)[0] if is_archive_ref(path) else path)
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return [None, None]
+
+class EmbeddingStore:
+    """
+    Memory-mapped float16 matrix of normalized CLIP image embeddings with a
+    path index, so aesthetic scores can be recomputed for new prompts without
+    re-encoding any image.
+
+    Layout in `directory`:
+        embeddings.f16  (capacity x dim) float16 rows
+        index.json      model name, dim, encoder configuration, row count and
+                        path -> [row, size, mtime_ns]
+
+    A store written for another model or encoder configuration is reset on
+    open, so embeddings from different working resolutions or quantized
+    models are never mixed.
+
+    Args:
+        directory (str): store location
+        model_name (str): CLIP model the embeddings come from
+        dim (int): embedding width
+        encoder (dict): everything else that changes the embeddings (e.g.
+            max_side, cpu_opt); None for read-only use, which accepts the
+            stored configuration
+    """
+    def __init__(self, directory, model_name='ViT-B/32', dim=512, encoder=None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.model_name = model_name
+        self.dim = dim
+        self.encoder = encoder
+        self.matrix_path = os.path.join(directory, 'embeddings.f16')
+        self.index_path = os.path.join(directory, 'index.json')
+
+        self.entries, self.count = {}, 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            stored_encoder = meta.get('encoder')
+            if encoder is None:
+                self.encoder = stored_encoder
+            if meta.get('model') != model_name or meta.get('dim') != dim:
+                logger.info(f"Embedding store at {directory} was built for {meta.get('model')}; resetting")
+            elif self.encoder != stored_encoder:
+                logger.info(f"Embedding store at {directory} was built with encoder settings {stored_encoder}, "
+                            f"not {self.encoder}; resetting")
+            else:
+                self.entries, self.count = meta['entries'], meta['count']
+        self.capacity = max(self.count, 1024)
+        self._open(self.capacity)
+
+    def _open(self, capacity):
+        nbytes = capacity * self.dim * 2
+        with open(self.matrix_path, 'ab') as f:
+            if f.tell() < nbytes:
+                f.truncate(nbytes)
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float16, mode='r+', shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, path):
+        return path in self.entries
+
+    def put(self, paths, embeddings):
+        """
+        Store normalized embeddings, overwriting rows for paths already present.
+
+        Args:
+            paths (list of str): image paths
+            embeddings (np.ndarray): (len(paths), dim) embeddings
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float16)
+        for path, emb in zip(paths, embeddings):
+            stamp = file_stamp(path)
+            entry = self.entries.get(path)
+            if entry is None:
+                if self.count == self.capacity:
+                    self.matrix.flush()
+                    del self.matrix
+                    self._open(self.capacity * 2)
+                entry = [self.count] + stamp
+                self.count += 1
+            else:
+                entry = [entry[0]] + stamp
+            self.entries[path] = entry
+            self.matrix[entry[0]] = emb
+
+    def rows(self, validate=True):
+        """
+        Args:
+            validate (bool): blank out rows whose file changed (size or mtime)
+                or disappeared since it was encoded
+
+        Returns:
+            tuple: (paths, matrix) with matrix the (len, dim) float16 view of
+            stored rows; paths[i] is None for rows that are unused or stale
+        """
+        paths = [None] * self.count
+        stale = 0
+        for path, entry in self.entries.items():
+            if validate and (entry[1] is None or file_stamp(path) != entry[1:]):
+                stale += 1
+                continue
+            paths[entry[0]] = path
+        if stale:
+            logger.warning(f"{stale} stored embeddings are stale (image changed or missing since encoding) "
+                           f"and are skipped")
+        return paths, self.matrix[:self.count]
+
+    def flush(self):
+        self.matrix.flush()
+        tmp = self.index_path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'model': self.model_name, 'dim': self.dim, 'encoder': self.encoder,
+                       'count': self.count, 'entries': self.entries}, f)
+        os.replace(tmp, self.index_path)
@@ -1,46 +1,156 @@
+import threading
 import cv2
 import numpy as np
 from .base import FeatureExtractor
-from utils.io import load_image_pil
+from utils.io import image_path
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+def exposure_from_mean(mean):
+    """Exposure score from mean gray level (0..255); scalar or array."""
+    mean = np.asarray(mean) / 255.0
+    return np.exp(-((mean - 0.5)**2)/(2*0.18**2))
+
+def contrast_from_std(std):
+    """Contrast score from gray level std (0..255); scalar or array."""
+    std = np.asarray(std) / 255.0
+    return 1 - np.exp(-(std**2)/(2*0.12**2))
+
+# long side (px) sharpness is measured at when no working resolution is set
+SHARPNESS_SIDE = 1024
+
+def resample_gray(gray, side):
+    """
+    Resize a gray frame so its long side is side: INTER_AREA when shrinking,
+    INTER_LINEAR when enlarging (a small image then measures as softer, as it
+    would look at that size).
+    """
+    h, w = gray.shape[:2]
+    scale = side / max(h, w)
+    if scale == 1:
+        return gray
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(gray, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+
+def gray_stats(gray, side=None):
+    """
+    Laplacian variance, mean and std of one gray frame.
+
+    Args:
+        gray (np.ndarray): HxW uint8 frame
+        side (int): if given, the Laplacian variance is measured on the frame
+            resampled to this long side, so it is comparable across image
+            resolutions; mean and std always use the frame as is
+
+    Returns:
+        tuple: (laplacian_var, mean, std) as floats
+    """
+    lap = cv2.Laplacian(gray if side is None else resample_gray(gray, side), cv2.CV_64F)
+    _, lap_std = cv2.meanStdDev(lap)
+    mean, std = cv2.meanStdDev(gray)
+    return float(lap_std[0, 0])**2, float(mean[0, 0]), float(std[0, 0])
+
+# fast face mode: detection frame bound (long side, px), pyramid step, face size
+# ratio of each search band, and the smallest face searched for as a fraction
+# of the frame's short side
+FAST_FACE_SIDE = 640
+FAST_FACE_SCALE = 1.15
+FAST_FACE_BAND = 3
+FAST_FACE_MIN_FRACTION = 0.06
+FACE_MODES = ('exhaustive', 'fast')
+
 class TechnicalFeatureExtractor(FeatureExtractor):
     """
     Computes technical features for images:
     sharpness, exposure, contrast, face count
     """
+    VERSION = 2
+    metrics_name = 'technical'
 
-    def __init__(self):
-        cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        self.face_cascade = cv2.CascadeClassifier(cascade_path)
-
-    def _variance_of_laplacian(self, cv_img):
-        gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-        return cv2.Laplacian(gray, cv2.CV_64F).var()
+    def __init__(self, max_side=None, face_mode='exhaustive'):
+        """
+        Args:
+            max_side (int): working resolution for decoding paths (None = native).
+                Sharpness is a Laplacian variance and depends on resolution, so
+                it is always measured with the frame resampled to max_side
+                (SHARPNESS_SIDE when None) on its long side.
+            face_mode (str): 'exhaustive' counts faces on the full frame;
+                'fast' only decides face presence (0 or 1) on a downscaled
+                frame, largest faces first. Check the agreement between the
+                two with scripts/check_face_mode.py.
+        """
+        if face_mode not in FACE_MODES:
+            raise ValueError(f"face_mode must be one of {FACE_MODES}, got {face_mode!r}")
+        self.max_side = max_side
+        self.sharpness_side = max_side or SHARPNESS_SIDE
+        self.face_mode = face_mode
+        self.cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        self._local = threading.local()
+        self.face_cascade  # load eagerly so a bad install fails here
 
-    def _exposure_score(self, cv_img):
-        gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-        mean = gray.mean() / 255.0
-        return np.exp(-((mean - 0.5)**2)/(2*0.18**2))
+    @property
+    def face_cascade(self):
+        """Haar cascade for the calling thread; detectMultiScale is not thread-safe."""
+        cascade = getattr(self._local, 'cascade', None)
+        if cascade is None:
+            cascade = self._local.cascade = cv2.CascadeClassifier(self.cascade_path)
+        return cascade
 
-    def _contrast_score(self, cv_img):
-        gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
-        std = gray.std() / 255.0
-        return 1 - np.exp(-(std**2)/(2*0.12**2))
+    def cache_key(self):
+        """Everything that changes the technical features, for feature caches."""
+        return {'extractor': 'technical', 'version': self.VERSION, 'face_mode': self.face_mode,
+                'sharpness_side': self.sharpness_side}
 
-    def _face_count(self, cv_img):
-        gray = cv2.cvtColor(cv_img, cv2.COLOR_BGR2GRAY)
+    def _face_count(self, gray):
+        if self.face_mode == 'fast':
+            return self._face_present_fast(gray)
         faces = self.face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4, minSize=(30,30))
         return len(faces)
 
-    def extract(self, image_path):
+    def _face_present_fast(self, gray):
+        """
+        1 if the frame contains a face, else 0.
+
+        The frame is bounded to FAST_FACE_SIDE and searched with a coarser
+        pyramid in bands of face size, largest first, stopping at the
+        first band with a detection. Faces smaller than FAST_FACE_MIN_FRACTION
+        of the short side are not searched for.
+        """
+        h, w = gray.shape[:2]
+        scale = FAST_FACE_SIDE / max(h, w)
+        if scale < 1:
+            gray = cv2.resize(gray, (max(1, round(w * scale)), max(1, round(h * scale))),
+                              interpolation=cv2.INTER_AREA)
+        short = min(gray.shape[:2])
+        min_face = max(24, int(short * FAST_FACE_MIN_FRACTION))  # 24 px: cascade window
+        hi = short
+        while hi >= min_face:
+            lo = max(min_face, hi // FAST_FACE_BAND)
+            faces = self.face_cascade.detectMultiScale(gray, scaleFactor=FAST_FACE_SCALE, minNeighbors=4,
+                                                       minSize=(lo, lo), maxSize=(hi, hi))
+            if len(faces):
+                return 1
+            if lo == min_face:
+                break
+            hi = lo
+        return 0
+
+    def _features(self, gray):
+        """All technical features from one gray frame in a single pass."""
+        with self.stage('stats'):
+            sharpness, mean, std = gray_stats(gray, self.sharpness_side)
+            exposure, contrast = float(exposure_from_mean(mean)), float(contrast_from_std(std))
+        with self.stage('faces'):
+            faces = self._face_count(gray)
+        return {'sharpness': sharpness, 'exposure': exposure, 'contrast': contrast, 'faces': faces}
+
+    def extract(self, image):
         """
         Compute technical features for an image.
 
         Args:
-            image_path (str): path to image
+            image (str or DecodedImage): path to image or shared decoded image
 
         Returns:
             dict: {'sharpness', 'exposure', 'contrast', 'faces'}
@@ -49,15 +159,11 @@ class TechnicalFeatureExtractor(FeatureExtractor):
             RuntimeError on failure.
         """
         try:
-            pil_img = load_image_pil(image_path)
-            cv_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-            features = {
-                'sharpness': self._variance_of_laplacian(cv_img),
-                'exposure': self._exposure_score(cv_img),
-                'contrast': self._contrast_score(cv_img),
-                'faces': self._face_count(cv_img)
-            }
-            return features
+            decoded = self.decode(image)
+            with self.stage('gray'):
+                gray = decoded.gray
+            return self._features(gray)
         except Exception as e:
-            logger.exception(f"Failed to extract technical features for {image_path}")
+            self.count_failure()
+            logger.exception(f"Failed to extract technical features for {image_path(image)}")
             raise RuntimeError(f"Failed to extract technical features: {e}")
@@ -1,26 +1,112 @@
 import itertools
 import os
+import numpy as np
 import tqdm
 from features.aesthetic import CLIPAestheticExtractor
 from features.technical import TechnicalFeatureExtractor
 from ranking.fusion import FeatureFusion
 from evaluation.proxy_metrics import ProxyEvaluator
-from utils.io import load_images_from_folder
+from utils.io import load_images_from_folder, image_path
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+def grid_weight_candidates(candidate_ranges):
+    """
+    All grid combinations whose weights sum to 1.
+
+    Returns:
+        tuple: (keys, W) with W of shape (len(keys), n_candidates)
+    """
+    keys = list(candidate_ranges.keys())
+    combos = []
+    for vals in itertools.product(*(candidate_ranges[k] for k in keys)):
+        if abs(sum(vals) - 1.0) < 1e-6:  # only keep combos summing to 1
+            combos.append(vals)
+    return keys, np.array(combos, dtype=np.float64).reshape(-1, len(keys)).T
+
+def random_weight_candidates(keys, n_samples, seed=0):
+    """
+    Weight vectors sampled uniformly from the simplex (Dirichlet(1, ..., 1)).
+
+    Returns:
+        tuple: (keys, W) with W of shape (len(keys), n_samples)
+    """
+    rng = np.random.default_rng(seed)
+    return list(keys), rng.dirichlet(np.ones(len(keys)), size=n_samples).T
+
+def extract_features(image_paths, aesthetic_extractor, technical_extractor, batch_size=32):
+    """Extract raw features once per image (one decode, batched CLIP)."""
+    feature_list = []
+    batches = aesthetic_extractor.iter_batches(image_paths, batch_size=batch_size)
+    for batch, aesthetic_batch in tqdm.tqdm(batches, desc="Extracting features",
+                                            total=-(-len(image_paths) // batch_size)):
+        for image, aesthetic in zip(batch, aesthetic_batch):
+            path = image_path(image)
+            try:
+                if aesthetic is None:
+                    raise RuntimeError("CLIP aesthetic unavailable")
+                features = dict(aesthetic)
+                features.update(technical_extractor.extract(image))
+                features['path'] = path
+                features['file'] = os.path.basename(path)
+                feature_list.append(features)
+            except Exception as e:
+                logger.error(f"Feature extraction failed for {path}: {e}")
+    return feature_list
+
+def search_weights(feature_list, proxy_eval: ProxyEvaluator, keys, W, metric='score_std', block=4096):
+    """
+    Score every candidate weight vector against already-extracted features.
+
+    Final scores for all candidates are one (images x features) @ (features x candidates)
+    product, evaluated in column blocks to bound memory.
+
+    Args:
+        feature_list (list of dict): raw features per image
+        proxy_eval (ProxyEvaluator): proxy evaluation instance
+        keys (list): weight keys, rows of W
+        W (np.ndarray): (len(keys), n_candidates) weight matrix
+        metric (str): metric to maximize
+        block (int): candidates scored per matrix product
+
+    Returns:
+        dict: {'best_weights':..., metric: ...}
+    """
+    fusion = FeatureFusion()
+    fused_list = fusion.fuse(feature_list)
+    X = fusion.feature_matrix(fused_list, keys)
+
+    best_metric_val = -float('inf')
+    best_weights = None
+    for start in range(0, W.shape[1], block):
+        W_block = W[:, start:start + block]
+        values = proxy_eval.evaluate_matrix(X @ W_block, fused_list)[metric]
+        i = int(np.argmax(values))
+        if values[i] > best_metric_val:
+            best_metric_val = float(values[i])
+            best_weights = {k: float(v) for k, v in zip(keys, W_block[:, i])}
+
+    logger.info(f"Best weights: {best_weights} -> {metric}={best_metric_val:.4f}")
+    return {'best_weights': best_weights, metric: best_metric_val}
+
 def optimize_weights_pipeline(input_dir, proxy_eval: ProxyEvaluator,
-                              candidate_ranges=None, metric='score_std', device='cpu'):
+                              candidate_ranges=None, metric='score_std', device='cpu',
+                              n_random=0, seed=0):
     """
     Optimize fusion weights for your current ranking pipeline.
 
+    Features are extracted once; every weight candidate is then scored with
+    matrix products over the cached feature matrix.
+
     Args:
         input_dir (str): Path to image folder
         proxy_eval (ProxyEvaluator): proxy evaluation instance
-        candidate_ranges (dict): weight candidates per feature
+        candidate_ranges (dict): weight candidates per feature (grid search)
         metric (str): metric to maximize ('score_std' or 'sharpness_corr')
         device (str): 'cpu' or 'cuda'
+        n_random (int): if > 0, also search this many weight vectors sampled from the simplex
+        seed (int): random seed for the sampled candidates
 
     Returns:
         dict: {'best_weights':..., metric: ...}
@@ -34,51 +120,20 @@ def optimize_weights_pipeline(input_dir, proxy_eval: ProxyEvaluator,
             'faces': [0.0, 0.05]
         }
 
-    keys = list(candidate_ranges.keys())
-    combos = []
-    for vals in itertools.product(*(candidate_ranges[k] for k in keys)):
-        if abs(sum(vals) - 1.0) < 1e-6:  # only keep combos summing to 1
-            combos.append(dict(zip(keys, vals)))
+    keys, W = grid_weight_candidates(candidate_ranges)
+    if n_random > 0:
+        _, W_random = random_weight_candidates(keys, n_random, seed=seed)
+        W = np.concatenate([W, W_random], axis=1)
 
-    logger.info(f"Total weight combinations to evaluate: {len(combos)}")
+    logger.info(f"Total weight combinations to evaluate: {W.shape[1]}")
 
     aesthetic_extractor = CLIPAestheticExtractor(device=device)
     technical_extractor = TechnicalFeatureExtractor()
 
     image_paths = load_images_from_folder(input_dir)
+    feature_list = extract_features(image_paths, aesthetic_extractor, technical_extractor)
 
-    best_metric_val = -float('inf')
-    best_weights = None
-
-    for w in combos:
-        feature_list = []
-        try:
-            # Extract features
-            for path in image_paths:
-                features = {}
-                features.update(aesthetic_extractor.extract(path))
-                features.update(technical_extractor.extract(path))
-                features['path'] = path
-                features['file'] = os.path.basename(path)
-                feature_list.append(features)
-
-            # Fuse with candidate weights
-            fusion = FeatureFusion(weights=w)
-            fused_list = fusion.fuse(feature_list)
-
-            # Evaluate proxy metrics
-            metrics = proxy_eval.evaluate(fused_list)
-            score = metrics.get(metric, -float('inf'))
-
-            if score > best_metric_val:
-                best_metric_val = score
-                best_weights = w
-
-        except Exception as e:
-            logger.exception(f"Failed evaluating weights {w}: {e}")
-
-    logger.info(f"Best weights: {best_weights} -> {metric}={best_metric_val:.4f}")
-    return {'best_weights': best_weights, metric: best_metric_val}
+    return search_weights(feature_list, proxy_eval, keys, W, metric=metric)
 
 
 # Example usage
@@ -0,0 +1,212 @@
+import numpy as np
+from utils.io import image_path
+from utils.logging import get_logger
+from utils.metrics import METRICS
+from .fusion import FeatureFusion, FeatureStats
+from .sharding import rank_table
+from .table import FeatureTable
+
+logger = get_logger(__name__)
+
+class _Certifier:
+    """
+    Counts the ranked rows that score strictly above a ceiling (the best
+    upper bound of the unscored rows), without re-ranking every scored row.
+
+    The ceiling only falls, and no unscored row can score above it, so rows
+    once above it keep their ranks and later ones rank after them: the
+    certified rows are a growing prefix of the final ranking. Without dedup,
+    the topk-th best score is found with a partial selection. With dedup,
+    each newly certified row (best-first, ties in input order as in
+    rank_table) is passed through the Deduplicator once.
+    """
+    def __init__(self, table, dedup=None):
+        self.dedup = dedup
+        self.paths = table['path'].tolist()
+        self.phashes = table['phash'].tolist() if dedup is not None else None
+        self.reset()
+
+    def reset(self):
+        self.done = np.zeros(len(self.paths), dtype=bool)
+        self.kept = 0
+        if self.dedup is not None:
+            self.dedup.reset()
+
+    def count(self, score, scored, ceiling, topk):
+        """
+        Args:
+            score (np.ndarray): fused score per row
+            scored (np.ndarray): bool mask of the rows scored so far
+            ceiling (float): best upper bound of the unscored rows
+            topk (int)
+
+        Returns:
+            int: at least topk once topk ranked rows are certified, else less
+        """
+        if self.dedup is None:
+            s = score[scored]
+            if len(s) < topk:
+                return int(np.count_nonzero(s > ceiling))
+            return topk if np.partition(s, len(s) - topk)[len(s) - topk] > ceiling else 0
+        new = np.flatnonzero(scored & ~self.done & (score > ceiling))
+        self.done[new] = True
+        for i in new[np.lexsort((new, -score[new]))]:
+            self.kept += self.dedup.keep({'path': self.paths[i], 'phash': self.phashes[i]})
+        return self.kept
+
+class CascadeRanker:
+    """
+    Top-K ranking that runs CLIP only on images that can still make the top K.
+
+    Pass 1 computes the cheap technical features (and pHash for dedup) of
+    every image. They fix the normalization bounds, so each image's technical
+    part of final_score is exact. The aesthetic score lies in 0..1, which
+    gives an upper bound per image: the fused score with the aesthetic at its
+    best value. Pass 2 scores images with CLIP in order of decreasing upper
+    bound. It stops once K ranked images (after dedup, if enabled) score
+    strictly above the best upper bound of every image not yet scored.
+
+    The bound is computed with fuse_table's own arithmetic, so it holds in
+    floating point. Final scores come from the same rank_table() as the
+    exhaustive run. The result is therefore the exhaustive ranking's leading
+    rows, exactly. This assumes CLIP fails on no image whose technical
+    features succeeded. Images that do fail are dropped and the bounds are
+    recomputed without them, as the exhaustive run would.
+
+    Args:
+        aesthetic_extractor (CLIPAestheticExtractor)
+        technical_extractor (TechnicalFeatureExtractor)
+        fusion (FeatureFusion)
+        dedup (Deduplicator): optional
+        batch_size (int): CLIP batch size; the stopping rule is checked per batch
+        num_workers (int): CLIP decode/preprocess threads
+    """
+    def __init__(self, aesthetic_extractor, technical_extractor, fusion=None, dedup=None,
+                 batch_size=32, num_workers=4):
+        self.aesthetic_extractor = aesthetic_extractor
+        self.technical_extractor = technical_extractor
+        self.fusion = fusion or FeatureFusion()
+        self.dedup = dedup
+        self.batch_size = batch_size
+        self.num_workers = num_workers
+        self.report = {}
+
+    def _technical(self, image_paths, pool=None, progress=None):
+        """Pass 1: rows of raw technical features (and pHash) in input order."""
+        rows = []
+
+        def keep(path, features):
+            features['path'] = path
+            features['file'] = path.split('/')[-1]
+            rows.append(features)
+
+        if pool is not None:
+            for path, features, _, error in pool.imap(image_paths):
+                if error is not None:
+                    logger.error(f"Feature extraction failed for {path}: {error}")
+                else:
+                    keep(path, features)
+                if progress is not None:
+                    progress.update(1)
+            return rows
+        for path in image_paths:
+            try:
+                decoded = self.technical_extractor.decode(path)
+                features = self.technical_extractor.extract(decoded)
+                if self.dedup is not None:
+                    features['phash'] = self.dedup.hash_image(decoded)
+                keep(image_path(path), features)
+            except Exception as e:
+                logger.error(f"Feature extraction failed for {image_path(path)}: {e}")
+            if progress is not None:
+                progress.update(1)
+        return rows
+
+    def _upper_bounds(self, table, alive):
+        """Fused score of every alive row with the aesthetic at its best value; -inf elsewhere."""
+        best = 1.0 if self.fusion.weights.get('aesthetic', 0) >= 0 else 0.0
+        bound = table.take(alive)
+        bound['aesthetic'] = np.full(len(bound), best)
+        stats = FeatureStats().update_columns(bound)
+        upper = np.full(len(table), -np.inf)
+        upper[alive] = self.fusion.fuse_table(bound, stats)['final_score']
+        return upper, stats
+
+    def run(self, image_paths, topk, pool=None, progress=None):
+        """
+        Args:
+            image_paths (list): paths (or archive refs) in input order
+            topk (int): number of leading rows that must be exact
+            pool (TechnicalPool): optional process pool for pass 1, created
+                without a CLIP preprocess
+            progress (tqdm): optional, advanced once per image in pass 1
+
+        Returns:
+            FeatureTable: the leading rows of the exhaustive ranking, at
+            least topk of them (fewer only if fewer images qualify), with
+            every row that could be certified exact
+        """
+        rows = self._technical(image_paths, pool, progress)
+        n = len(rows)
+        self.report = {'images': n, 'clip_evaluated': 0, 'clip_skipped': n, 'clip_failed': 0}
+        if not n:
+            return FeatureTable()
+        table = FeatureTable.from_dicts(rows, columns=['file', 'path', 'sharpness', 'exposure', 'contrast', 'faces'])
+        if self.dedup is not None:
+            table['phash'] = ['' if r.get('phash') is None else str(r['phash']) for r in rows]
+        table['aesthetic'] = np.zeros(n)
+        alive = np.ones(n, dtype=bool)
+        scored = np.zeros(n, dtype=bool)
+        upper, stats = self._upper_bounds(table, alive)
+        # static visiting order; the stopping rule only relies on the live bounds
+        order = np.argsort(-upper, kind='stable')
+        row_of = {p: i for i, p in enumerate(table['path'].tolist())}
+        paths = table['path'].tolist()
+
+        # fused score of every scored row; the bounds are fixed, so a row's
+        # score does not change as more rows are scored
+        score = np.full(n, -np.inf)
+        certifier = _Certifier(table, self.dedup)
+        with METRICS.timer('cascade.clip_pass'):
+            batches = self.aesthetic_extractor.iter_batches(
+                (paths[i] for i in order), batch_size=self.batch_size, num_workers=self.num_workers)
+            for batch, aesthetic_batch in batches:
+                failed = False
+                new = []
+                for image, aesthetic in zip(batch, aesthetic_batch):
+                    i = row_of[image_path(image)]
+                    if aesthetic is None:
+                        logger.error(f"Feature extraction failed for {paths[i]}: CLIP aesthetic unavailable")
+                        alive[i] = False
+                        failed = True
+                        self.report['clip_failed'] += 1
+                    else:
+                        table['aesthetic'][i] = aesthetic['aesthetic']
+                        scored[i] = True
+                        new.append(i)
+                if failed:
+                    # the bounds moved: rescore everything and certify again
+                    upper, stats = self._upper_bounds(table, alive)
+                    new = np.flatnonzero(scored)
+                    certifier.reset()
+                if len(new):
+                    new = np.asarray(new, dtype=np.int64)
+                    score[new] = self.fusion.fuse_table(table.take(new), stats)['final_score']
+                remaining = alive & ~scored
+                if not remaining.any():
+                    break
+                if certifier.count(score, scored, upper[remaining].max(), topk) >= topk:
+                    break
+            batches.close()
+
+        remaining = alive & ~scored
+        ceiling = upper[remaining].max() if remaining.any() else -np.inf
+        ranked = rank_table(table.take(scored), self.fusion, self.dedup, stats) if scored.any() else FeatureTable()
+        ranked = ranked.take(ranked['final_score'] > ceiling) if len(ranked) else ranked
+        evaluated = int(scored.sum()) + self.report['clip_failed']
+        self.report.update(clip_evaluated=evaluated, clip_skipped=n - evaluated, certified=len(ranked))
+        METRICS.inc('cascade.clip_evaluated', evaluated)
+        METRICS.inc('cascade.clip_skipped', n - evaluated)
+        logger.info(f"Cascade: CLIP ran on {evaluated} of {n} images, skipped {n - evaluated} "
+                    f"({100.0 * (n - evaluated) / n:.1f}%); {len(ranked)} leading rows are exact")
+        return ranked
@@ -1,32 +1,67 @@
 import imagehash
-from PIL import Image
+from utils.io import load_decoded
+from utils.metrics import METRICS
+from .hash_index import MultiIndexHash
 
 class Deduplicator:
     """
     Remove near-duplicate images using perceptual hashing (pHash)
     """
-    def __init__(self, threshold=8):
+    def __init__(self, threshold=8, max_side=None):
         self.threshold = threshold
+        self.max_side = max_side
+        self.index = MultiIndexHash(radius=threshold)
+
+    def hash_image(self, image):
+        """
+        64-bit pHash of a path or DecodedImage as an int, computed from the
+        shared gray buffer.
+        """
+        decoded = load_decoded(image, self.max_side)
+        with METRICS.timer('dedup.phash'):
+            return int(str(imagehash.phash(decoded.gray_pil)), 16)
+
+    def reset(self):
+        """Forget every kept hash."""
+        self.index = MultiIndexHash(radius=self.threshold)
+
+    def keep(self, img):
+        """
+        True if img is not a near duplicate of an image kept since the last
+        reset(), remembering its hash; False for duplicates and for images
+        that cannot be hashed.
+        """
+        try:
+            h = img.get('phash')
+            if h in (None, ''):
+                h = self.hash_image(img['path'])
+            h = int(h)
+        except Exception as e:
+            return False
+        if self.index.any_within(h, self.threshold):
+            return False
+        self.index.add(h, img['path'])
+        return True
+
+    def iter_dedup(self, images):
+        """
+        Streaming dedup: yields the images of an iterable that are not near
+        duplicates of an earlier one. Only the kept hashes are held in memory.
+        """
+        self.reset()
+        for img in images:
+            if self.keep(img):
+                yield img
 
     def dedup(self, images):
         """
-        images: list of dicts with 'path' key
+        images: list of dicts with 'path' key, and optionally a precomputed
+                'phash' (see hash_image) so the image is not decoded again.
+                Earlier images win, so pass them best-first.
         returns: deduplicated list
         """
-        hashes = {}
-        keep = []
-        for img in images:
-            try:
-                pil = Image.open(img['path']).convert('RGB')
-                h = imagehash.phash(pil)
-                duplicate = False
-                for existing_h in hashes.values():
-                    if h - existing_h <= self.threshold:
-                        duplicate = True
-                        break
-                if not duplicate:
-                    keep.append(img)
-                    hashes[img['path']] = h
-            except Exception as e:
-                continue
-        return keep
\ No newline at end of file
+        return list(self.iter_dedup(images))
+
+    def save_index(self, path):
+        """Persist the hashes of the kept images."""
+        self.index.save(path)
@@ -1,13 +1,93 @@
+import json
 import numpy as np
 from utils.logging import get_logger
 
 logger = get_logger(__name__)
 
+class FeatureStats:
+    """
+    Running min/max of the normalized features, as seen by FeatureFusion
+    (sharpness in log1p space). Can be updated incrementally, merged across
+    shards or passes, and saved as JSON, so normalization does not need the
+    whole collection in memory.
+    """
+    KEYS = ['sharpness', 'exposure', 'contrast']
+    LOG_SCALE = {'sharpness'}
+
+    def __init__(self, bounds=None, count=0):
+        """
+        Args:
+            bounds (dict): optional key -> [min, max]
+            count (int): number of images seen
+        """
+        self.bounds = {k: list(v) for k, v in (bounds or {}).items()}
+        self.count = count
+
+    @classmethod
+    def transform(cls, key, values):
+        values = np.asarray(values, dtype=np.float64)
+        return np.log1p(values) if key in cls.LOG_SCALE else values
+
+    def update(self, feature_dicts):
+        """Fold raw feature dicts into the running bounds."""
+        feature_dicts = list(feature_dicts)
+        if not feature_dicts:
+            return self
+        return self.update_columns({key: [fd[key] for fd in feature_dicts] for key in self.KEYS})
+
+    def update_columns(self, columns):
+        """Fold raw feature columns (e.g. a FeatureTable) into the running bounds."""
+        n = len(columns[self.KEYS[0]])
+        if n == 0:
+            return self
+        for key in self.KEYS:
+            vals = self.transform(key, columns[key])
+            lo, hi = float(vals.min()), float(vals.max())
+            if key in self.bounds:
+                lo, hi = min(lo, self.bounds[key][0]), max(hi, self.bounds[key][1])
+            self.bounds[key] = [lo, hi]
+        self.count += n
+        return self
+
+    def merge(self, other):
+        """Combine with stats from another shard or pass."""
+        merged = FeatureStats(self.bounds, self.count + other.count)
+        for key, (lo, hi) in other.bounds.items():
+            if key in merged.bounds:
+                lo, hi = min(lo, merged.bounds[key][0]), max(hi, merged.bounds[key][1])
+            merged.bounds[key] = [lo, hi]
+        return merged
+
+    def to_dict(self):
+        return {'bounds': self.bounds, 'count': self.count}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['bounds'], d.get('count', 0))
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
 class FeatureFusion:
     """
     Combines multiple feature dicts into a single final score using weighted sum.
     """
 
+    # weight key -> fused column it multiplies
+    WEIGHT_COLUMNS = {
+        'aesthetic': 'aesthetic',
+        'sharpness': 'sharpness_norm',
+        'exposure': 'exposure_norm',
+        'contrast': 'contrast_norm',
+        'faces': 'face_present'
+    }
+
     def __init__(self, weights=None):
         """
         Args:
@@ -21,32 +101,48 @@ class FeatureFusion:
             'faces': 0.05
         }
 
-    def normalize(self, values, log_scale=False):
+    def normalize(self, values, log_scale=False, bounds=None, clip=False):
         """
         Min-max normalize an array to 0..1
+
+        Args:
+            values: raw values
+            log_scale (bool): apply log1p first
+            bounds (tuple): optional (min, max) in the (log) space, e.g. from
+                FeatureStats; defaults to the min/max of values
+            clip (bool): clamp to 0..1, for values outside stored bounds
         """
         try:
             values = np.array(values)
             if log_scale:
                 values = np.log1p(values)
-            normed = (values - values.min()) / (np.ptp(values)+1e-9)
+            if bounds is None:
+                lo, ptp = values.min(), np.ptp(values)
+            else:
+                lo, ptp = bounds[0], bounds[1] - bounds[0]
+            normed = (values - lo) / (ptp+1e-9)
+            if clip:
+                normed = np.clip(normed, 0.0, 1.0)
             return normed
         except Exception as e:
             logger.exception("Normalization failed")
             raise RuntimeError(f"Normalization failed: {e}")
 
-    def fuse(self, feature_dicts):
+    def fuse(self, feature_dicts, stats=None):
         """
         Args:
             feature_dicts (list of dicts): each dict contains features for one image
+            stats (FeatureStats): optional global normalization bounds; by default
+                the bounds of feature_dicts themselves
 
         Returns:
             list of dicts: each dict includes 'final_score'
         """
         try:
-            for key in ['sharpness','exposure','contrast']:
+            for key in FeatureStats.KEYS:
                 vals = [fd[key] for fd in feature_dicts]
-                normed = self.normalize(vals, log_scale=(key=='sharpness'))
+                bounds = stats.bounds[key] if stats is not None else None
+                normed = self.normalize(vals, log_scale=(key in FeatureStats.LOG_SCALE), bounds=bounds)
                 for i, fd in enumerate(feature_dicts):
                     fd[f"{key}_norm"] = float(normed[i])
 
@@ -67,3 +163,56 @@ class FeatureFusion:
         except Exception as e:
             logger.exception("Feature fusion failed")
             raise RuntimeError(f"Feature fusion failed: {e}")
+
+    def fuse_table(self, table, stats=None, clip=False):
+        """
+        Vectorized fuse() over a FeatureTable, adding the normalized columns,
+        'face_present' and 'final_score' in place. Produces the same values as
+        fuse() on the equivalent dicts.
+
+        Args:
+            table (FeatureTable): raw feature columns
+            stats (FeatureStats): optional global normalization bounds
+            clip (bool): clamp normalized values to 0..1 (for stats from another collection)
+
+        Returns:
+            FeatureTable: the same table
+        """
+        try:
+            for key in FeatureStats.KEYS:
+                bounds = stats.bounds[key] if stats is not None else None
+                table[f"{key}_norm"] = self.normalize(table[key], log_scale=(key in FeatureStats.LOG_SCALE),
+                                                      bounds=bounds, clip=clip)
+            table['face_present'] = (table['faces'] > 0).astype(np.int64)
+
+            n = len(table)
+            column = lambda name: table[name] if name in table else np.zeros(n)
+            table['final_score'] = (
+                self.weights.get('aesthetic',0)*column('aesthetic') +
+                self.weights.get('sharpness',0)*column('sharpness_norm') +
+                self.weights.get('exposure',0)*column('exposure_norm') +
+                self.weights.get('contrast',0)*column('contrast_norm') +
+                self.weights.get('faces',0)*column('face_present')
+            )
+            logger.info("Feature fusion completed")
+            return table
+        except Exception as e:
+            logger.exception("Feature fusion failed")
+            raise RuntimeError(f"Feature fusion failed: {e}")
+
+    def feature_matrix(self, fused_dicts, keys=None):
+        """
+        Stack fused feature dicts into an (images x features) matrix whose
+        columns line up with the weight keys, so final scores for any weight
+        vector w are feature_matrix @ w.
+
+        Args:
+            fused_dicts (list of dicts): output of fuse()
+            keys (list): weight keys, defaults to WEIGHT_COLUMNS order
+
+        Returns:
+            np.ndarray: (len(fused_dicts), len(keys)) float64 matrix
+        """
+        keys = keys or list(self.WEIGHT_COLUMNS)
+        cols = [self.WEIGHT_COLUMNS[k] for k in keys]
+        return np.array([[fd.get(c, 0) for c in cols] for fd in fused_dicts], dtype=np.float64).reshape(-1, len(cols))
@@ -0,0 +1,113 @@
+import itertools
+from collections import defaultdict
+import numpy as np
+
+try:
+    _popcount = int.bit_count
+except AttributeError:  # Python < 3.10
+    def _popcount(x):
+        return bin(x).count('1')
+
+def hamming(a, b):
+    """Hamming distance between two integer hashes."""
+    return _popcount(a ^ b)
+
+class MultiIndexHash:
+    """
+    Multi-index hashing over integer hashes for Hamming-radius queries.
+
+    Each hash is split into m disjoint bit segments, and every segment value
+    is indexed in its own table. By the pigeonhole principle, two hashes within
+    distance `radius` agree to within radius // m bits on at least one segment,
+    so a query only probes the few segment values near its own and checks the
+    candidates it finds there, instead of comparing against every stored hash.
+
+    Args:
+        radius (int): largest query radius the index must answer exactly
+        bits (int): hash width
+    """
+    def __init__(self, radius=8, bits=64):
+        self.radius = radius
+        self.bits = bits
+        m = min(radius // 2 + 1, bits)
+        self.sub_radius = radius // m
+        widths = [bits // m + (1 if i < bits % m else 0) for i in range(m)]
+        offsets = [sum(widths[:i]) for i in range(m)]
+        self.segments = [(off, (1 << w) - 1) for off, w in zip(offsets, widths)]
+        # xor masks reaching every value within sub_radius of a segment value
+        self._flips = {}
+        for w in set(widths):
+            self._flips[w] = [sum(1 << b for b in combo)
+                              for r in range(self.sub_radius + 1)
+                              for combo in itertools.combinations(range(w), r)]
+        self._widths = widths
+        self.tables = [defaultdict(list) for _ in range(m)]
+        self.hashes = []
+        self.items = []
+
+    @classmethod
+    def from_hashes(cls, hashes, items=None, radius=8, bits=64):
+        """Bulk-build an index from integer hashes and optional payloads."""
+        index = cls(radius=radius, bits=bits)
+        items = items if items is not None else [None] * len(hashes)
+        for h, item in zip(hashes, items):
+            index.add(int(h), item)
+        return index
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, h, item=None):
+        idx = len(self.hashes)
+        self.hashes.append(h)
+        self.items.append(item)
+        for table, (off, mask) in zip(self.tables, self.segments):
+            table[(h >> off) & mask].append(idx)
+
+    def _candidates(self, h):
+        seen = set()
+        for table, (off, mask), w in zip(self.tables, self.segments, self._widths):
+            value = (h >> off) & mask
+            for flip in self._flips[w]:
+                for idx in table.get(value ^ flip, ()):
+                    if idx not in seen:
+                        seen.add(idx)
+                        yield idx
+
+    def _check_radius(self, radius):
+        radius = self.radius if radius is None else radius
+        if radius > self.radius:
+            raise ValueError(f"Index built for radius <= {self.radius}, got {radius}")
+        return radius
+
+    def query(self, h, radius=None):
+        """
+        Returns:
+            list of tuple: (distance, hash, item) for every stored hash within radius
+        """
+        radius = self._check_radius(radius)
+        found = []
+        for idx in self._candidates(h):
+            d = hamming(h, self.hashes[idx])
+            if d <= radius:
+                found.append((d, self.hashes[idx], self.items[idx]))
+        return found
+
+    def any_within(self, h, radius=None):
+        """True if some stored hash is within radius (stops at the first match)."""
+        radius = self._check_radius(radius)
+        return any(hamming(h, self.hashes[idx]) <= radius for idx in self._candidates(h))
+
+    def save(self, path):
+        """Persist the hashes (and string payloads) to an .npz file."""
+        np.savez(path,
+                 hashes=np.array(self.hashes, dtype=np.uint64),
+                 items=np.array(['' if i is None else str(i) for i in self.items]),
+                 config=np.array([self.radius, self.bits]))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        radius, bits = (int(v) for v in data['config'])
+        return cls.from_hashes([int(h) for h in data['hashes']], list(data['items']),
+                               radius=radius, bits=bits)
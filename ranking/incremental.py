@@ -0,0 +1,275 @@
+from bisect import bisect_left, insort
+import numpy as np
+from utils.logging import get_logger
+from .fusion import FeatureFusion, FeatureStats
+
+logger = get_logger(__name__)
+
+class SortedList:
+    """
+    Sorted multiset kept in buckets of bounded size (the sortedcontainers
+    layout): insert, remove and lookup bisect the bucket maxima and then one
+    bucket, so they cost O(log n) comparisons plus a bounded memmove.
+    Positions (rank queries) use cached per-bucket offsets.
+    """
+    LOAD = 512
+
+    def __init__(self, values=()):
+        values = sorted(values)
+        self._lists = [values[i:i + self.LOAD] for i in range(0, len(values), self.LOAD)]
+        self._maxes = [lst[-1] for lst in self._lists]
+        self._len = len(values)
+        self._offsets = None
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        for lst in self._lists:
+            yield from lst
+
+    def add(self, value):
+        if not self._lists:
+            self._lists.append([value])
+            self._maxes.append(value)
+        else:
+            i = bisect_left(self._maxes, value)
+            if i == len(self._maxes):
+                i -= 1
+                self._lists[i].append(value)
+                self._maxes[i] = value
+            else:
+                insort(self._lists[i], value)
+            if len(self._lists[i]) > 2 * self.LOAD:
+                lst = self._lists[i]
+                self._lists[i:i + 1] = [lst[:self.LOAD], lst[self.LOAD:]]
+                self._maxes[i:i + 1] = [lst[self.LOAD - 1], lst[-1]]
+        self._len += 1
+        self._offsets = None
+
+    def _locate(self, value):
+        i = bisect_left(self._maxes, value)
+        if i < len(self._lists):
+            lst = self._lists[i]
+            j = bisect_left(lst, value)
+            if j < len(lst) and lst[j] == value:
+                return i, j
+        raise ValueError(f"{value!r} not in list")
+
+    def remove(self, value):
+        i, j = self._locate(value)
+        lst = self._lists[i]
+        del lst[j]
+        if lst:
+            self._maxes[i] = lst[-1]
+        else:
+            del self._lists[i]
+            del self._maxes[i]
+        self._len -= 1
+        self._offsets = None
+
+    def index(self, value):
+        """Position of value (the first one, for duplicates)."""
+        i, j = self._locate(value)
+        if self._offsets is None:
+            self._offsets = np.concatenate([[0], np.cumsum([len(lst) for lst in self._lists])]).tolist()
+        return self._offsets[i] + j
+
+    def head(self, k):
+        """The k smallest values."""
+        out = []
+        for lst in self._lists:
+            if len(out) >= k:
+                break
+            out.extend(lst[:k - len(out)])
+        return out
+
+    def first(self):
+        return self._lists[0][0]
+
+    def last(self):
+        return self._lists[-1][-1]
+
+class IncrementalRanker:
+    """
+    Maintains the ranking of a growing or shrinking collection without
+    re-fusing it on every change.
+
+    Raw features live in columnar slots, the normalization bounds are tracked
+    with one sorted multiset per normalized feature (so removals can shrink
+    them), and the order is a SortedList of (-final_score, seq, slot) keys. While an
+    insert or remove leaves every bound unchanged, only that image is scored
+    and (re)placed in O(log n). A bound change shifts every normalized value,
+    and with it every score, so all live images are re-scored in one
+    vectorized pass and the index is rebuilt.
+
+    Scores, tie order (insertion order) and rankings are identical to
+    FeatureFusion.fuse_table() plus a stable sort over the live images in
+    insertion order.
+
+    Args:
+        fusion (FeatureFusion): weights; default FeatureFusion()
+        capacity (int): initial slot capacity (grows by doubling)
+    """
+    def __init__(self, fusion=None, capacity=1024):
+        self.fusion = fusion or FeatureFusion()
+        self._cols = {k: np.zeros(capacity) for k in FeatureStats.KEYS + ['aesthetic', 'face_present']}
+        self._seq = np.zeros(capacity, dtype=np.int64)
+        self._score = np.zeros(capacity)
+        self._paths = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self._slot = {}  # path -> slot
+        self._next_seq = 0
+        self._values = {k: SortedList() for k in FeatureStats.KEYS}
+        self._order = SortedList()
+        self.bounds = {}
+        self.rescores = 0
+
+    def __len__(self):
+        return len(self._slot)
+
+    def __contains__(self, path):
+        return path in self._slot
+
+    @property
+    def stats(self):
+        """Current normalization bounds as FeatureStats (log1p space for sharpness)."""
+        return FeatureStats(self.bounds, len(self))
+
+    # internals ------------------------------------------------------------
+
+    def _grow(self):
+        old = len(self._seq)
+        for k, col in self._cols.items():
+            self._cols[k] = np.concatenate([col, np.zeros(old)])
+        self._seq = np.concatenate([self._seq, np.zeros(old, dtype=np.int64)])
+        self._score = np.concatenate([self._score, np.zeros(old)])
+        self._paths.extend([None] * old)
+        self._free.extend(range(2 * old - 1, old - 1, -1))
+
+    def _current_bounds(self):
+        if not self._slot:
+            return {}
+        return {k: [self._values[k].first(), self._values[k].last()] for k in FeatureStats.KEYS}
+
+    def _scores(self, slots):
+        """fuse_table's arithmetic for the given slots under the current bounds."""
+        w = self.fusion.weights
+        total = w.get('aesthetic', 0) * self._cols['aesthetic'][slots]
+        for key in FeatureStats.KEYS:
+            lo, hi = self.bounds[key]
+            normed = (self._cols[key][slots] - lo) / ((hi - lo) + 1e-9)
+            total = total + w.get(key, 0) * normed
+        return total + w.get('faces', 0) * self._cols['face_present'][slots]
+
+    def _key(self, slot):
+        # seq is unique, so the trailing slot never takes part in comparisons
+        return (-float(self._score[slot]), int(self._seq[slot]), int(slot))
+
+    def _rescore_all(self):
+        self.rescores += 1
+        slots = np.fromiter(self._slot.values(), dtype=np.int64, count=len(self._slot))
+        if not len(slots):
+            self._order = SortedList()
+            return
+        self._score[slots] = self._scores(slots)
+        order = np.lexsort((self._seq[slots], -self._score[slots]))
+        self._order = SortedList(self._key(s) for s in slots[order])
+
+    def _refresh(self):
+        """Re-score everything if the bounds moved; returns whether they did."""
+        bounds = self._current_bounds()
+        if bounds == self.bounds:
+            return False
+        self.bounds = bounds
+        self._rescore_all()
+        return True
+
+    def _insert(self, path, features):
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self._slot[path] = slot
+        self._paths[slot] = path
+        self._seq[slot] = self._next_seq
+        self._next_seq += 1
+        self._cols['aesthetic'][slot] = features['aesthetic']
+        self._cols['face_present'][slot] = int(features['faces'] > 0)
+        for key in FeatureStats.KEYS:
+            value = float(FeatureStats.transform(key, features[key]))
+            self._cols[key][slot] = value
+            self._values[key].add(value)
+        return slot
+
+    def _delete(self, path):
+        slot = self._slot.pop(path)
+        if self.bounds:
+            self._order.remove(self._key(slot))
+        for key in FeatureStats.KEYS:
+            self._values[key].remove(float(self._cols[key][slot]))
+        self._paths[slot] = None
+        self._free.append(slot)
+
+    def _place(self, slot):
+        self._score[slot] = self._scores(np.array([slot]))[0]
+        self._order.add(self._key(slot))
+
+    # updates --------------------------------------------------------------
+
+    def add(self, path, features):
+        """
+        Insert an image, or replace it if path is already ranked (it then
+        counts as newest for tie order).
+
+        Args:
+            path (str): image path
+            features (dict): raw 'aesthetic', 'sharpness', 'exposure',
+                'contrast' and 'faces'
+        """
+        self.add_many([(path, features)])
+
+    def add_many(self, items):
+        """Insert (path, features) pairs; bounds are checked once for the whole batch."""
+        new = []
+        for path, features in dict(items).items():
+            if path in self._slot:
+                self._delete(path)
+            new.append(self._insert(path, features))
+        if not self._refresh():
+            for slot in new:
+                self._place(slot)
+
+    def remove(self, path):
+        """Drop an image; raises KeyError if it is not ranked."""
+        self.remove_many([path])
+
+    def remove_many(self, paths):
+        for path in paths:
+            self._delete(path)
+        self._refresh()
+
+    # queries --------------------------------------------------------------
+
+    def _row(self, key):
+        slot = key[2]
+        row = {'path': self._paths[slot], 'file': self._paths[slot].split('/')[-1],
+               'final_score': -key[0], 'aesthetic': float(self._cols['aesthetic'][slot])}
+        for k in FeatureStats.KEYS:
+            lo, hi = self.bounds[k]
+            row[f"{k}_norm"] = float((self._cols[k][slot] - lo) / ((hi - lo) + 1e-9))
+        row['face_present'] = int(self._cols['face_present'][slot])
+        return row
+
+    def topk(self, k):
+        """
+        Returns:
+            list of dict: the k best images, best first, with the fused columns
+        """
+        return [self._row(key) for key in self._order.head(k)]
+
+    def rank_of(self, path):
+        """1-based rank of an image (KeyError if it is not ranked)."""
+        return self._order.index(self._key(self._slot[path])) + 1
+
+    def score_of(self, path):
+        return float(self._score[self._slot[path]])
@@ -0,0 +1,139 @@
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+from utils.logging import get_logger
+from .fusion import FeatureStats
+from .table import FeatureTable
+
+logger = get_logger(__name__)
+
+SHARD_MODES = ('hash', 'range')
+
+def parse_shard(spec):
+    """'2/8' -> (2, 8)."""
+    try:
+        shard, num_shards = (int(x) for x in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Shard must look like I/N, got {spec!r}")
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"Shard index {shard} out of range for {num_shards} shards")
+    return shard, num_shards
+
+def shard_of(path, num_shards):
+    """Stable hash shard of a path; independent of the node and Python's hash seed."""
+    digest = hashlib.sha1(path.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % num_shards
+
+def select_shard(paths, shard, num_shards, by='hash'):
+    """
+    Deterministic slice of the full, ordered input list.
+
+    Every node lists the same input (sorted directory listing or manifest) and
+    keeps its slice, remembering each image's position in the full list so
+    the merge can restore the single-node order.
+
+    Args:
+        paths (list of str): all input paths, in run order
+        shard (int): this node's shard index
+        num_shards (int): total shards
+        by (str): 'hash' (by path digest; stable when files are added) or
+            'range' (contiguous index ranges of equal size)
+
+    Returns:
+        list of tuple: (index, path) pairs of this shard
+    """
+    if by == 'range':
+        lo, hi = shard * len(paths) // num_shards, (shard + 1) * len(paths) // num_shards
+        return list(enumerate(paths))[lo:hi]
+    if by == 'hash':
+        return [(i, p) for i, p in enumerate(paths) if shard_of(p, num_shards) == shard]
+    raise ValueError(f"Unknown shard mode {by!r}, expected one of {SHARD_MODES}")
+
+def shard_prefix(directory, shard, num_shards):
+    return os.path.join(directory, f"shard-{shard:04d}-of-{num_shards:04d}")
+
+def save_shard(directory, shard, num_shards, table, meta):
+    """
+    Write one shard's raw features (<prefix>.npz, with an 'index' column giving
+    each row's position in the full input) and its partial normalization
+    stats plus run metadata (<prefix>.json).
+    """
+    os.makedirs(directory, exist_ok=True)
+    prefix = shard_prefix(directory, shard, num_shards)
+    table.save_npz(prefix + '.npz')
+    stats = FeatureStats().update_columns(table)
+    with open(prefix + '.json', 'w', encoding='utf-8') as f:
+        json.dump(dict(meta, shard=shard, num_shards=num_shards, rows=len(table),
+                       stats=stats.to_dict()), f, indent=2)
+    logger.info(f"Saved shard {shard}/{num_shards} ({len(table)} images) to {prefix}.npz")
+    return prefix
+
+def load_shards(directory):
+    """
+    Combine every shard of a run.
+
+    Returns:
+        tuple: (table, stats, meta) where table holds all rows in the
+        single-node input order, stats is the merged FeatureStats and meta
+        the metadata shared by the shards
+
+    Raises:
+        RuntimeError if shards are missing, duplicated or from different runs.
+    """
+    metas = []
+    for path in sorted(glob.glob(os.path.join(directory, 'shard-*-of-*.json'))):
+        with open(path, encoding='utf-8') as f:
+            metas.append(json.load(f))
+    if not metas:
+        raise RuntimeError(f"No shards found in {directory}")
+
+    num_shards = metas[0]['num_shards']
+    shared = {k: v for k, v in metas[0].items() if k not in ('shard', 'rows', 'stats')}
+    for m in metas:
+        mismatch = [k for k, v in shared.items() if m.get(k) != v]
+        if mismatch:
+            raise RuntimeError(f"Shard {m['shard']} differs from shard {metas[0]['shard']} in {mismatch}")
+    found = sorted(m['shard'] for m in metas)
+    if found != list(range(num_shards)):
+        missing = sorted(set(range(num_shards)) - set(found))
+        raise RuntimeError(f"Expected shards 0..{num_shards - 1}, missing {missing}, found {found}")
+
+    tables, stats = [], FeatureStats()
+    for m in metas:
+        table = FeatureTable.load_npz(shard_prefix(directory, m['shard'], num_shards) + '.npz')
+        if len(table) != m['rows']:
+            raise RuntimeError(f"Shard {m['shard']} has {len(table)} rows, its metadata says {m['rows']}")
+        tables.append(table)
+        stats = stats.merge(FeatureStats.from_dict(m['stats']))
+    table = FeatureTable.concat(tables)
+    if len(table):
+        table = table.take(np.argsort(table['index'], kind='stable'))
+    logger.info(f"Merged {num_shards} shards: {len(table)} images")
+    return table, stats, shared
+
+def rank_table(table, fusion, dedup=None, stats=None):
+    """
+    Fuse, sort best-first (stable, so ties keep input order) and optionally
+    drop near-duplicates, keeping the best-scored image of each group.
+    Shared by single-node and merged runs so both rank identically.
+
+    Args:
+        table (FeatureTable): raw features in input order; a 'phash' column
+            avoids re-hashing for dedup
+        fusion (FeatureFusion)
+        dedup (Deduplicator): optional
+        stats (FeatureStats): global bounds; by default the table's own
+
+    Returns:
+        FeatureTable: ranked rows
+    """
+    ranked = fusion.fuse_table(table, stats).sort_by('final_score')
+    if dedup is not None:
+        phashes = ranked['phash'].tolist() if 'phash' in ranked else [None] * len(ranked)
+        kept = dedup.dedup([{'path': p, 'phash': h, 'row': i}
+                            for i, (p, h) in enumerate(zip(ranked['path'].tolist(), phashes))])
+        ranked = ranked.take(np.array([k['row'] for k in kept], dtype=np.int64))
+        logger.info(f"Dedup kept {len(ranked)} of {len(table)} images")
+    return ranked
@@ -0,0 +1,284 @@
+import csv
+import heapq
+import os
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from utils.logging import get_logger
+from utils.metrics import METRICS
+from .fusion import FeatureFusion, FeatureStats
+
+logger = get_logger(__name__)
+
+RAW_FIELDS = ['path', 'file', 'aesthetic', 'sharpness', 'exposure', 'contrast', 'faces', 'phash']
+_FLOAT_FIELDS = ['aesthetic', 'sharpness', 'exposure', 'contrast']
+_DONE = object()
+
+def _read_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+def _parse_raw(row):
+    for k in _FLOAT_FIELDS:
+        row[k] = float(row[k])
+    row['faces'] = int(row['faces'])
+    return row
+
+class StreamingRanker:
+    """
+    Bounded-memory ranking pipeline for very large collections.
+
+    Pass 1 runs decode -> extract -> spill as stages connected by bounded
+    queues: decoding runs on a thread pool, CLIP and technical features on the
+    calling thread, and a writer thread appends raw features to a spill file
+    while folding them into running FeatureStats. Pass 2 re-reads the spill,
+    normalizes with the global bounds, keeps a top-k heap and writes sorted
+    runs that are merged into the output CSV (external sort). Peak memory
+    depends on queue_size, batch_size and run_size, not on the collection.
+
+    Args:
+        aesthetic_extractor (CLIPAestheticExtractor)
+        technical_extractor (TechnicalFeatureExtractor)
+        fusion (FeatureFusion)
+        dedup (Deduplicator): optional, applied best-first while merging
+        work_dir (str): spill/run directory (a temp dir by default)
+        batch_size (int): CLIP batch size
+        decode_workers (int): decoding threads
+        queue_size (int): decoded images held at once, in flight on the
+            decode pool plus waiting for CLIP (half each); with native
+            decoding (max_side=None) each can be tens of MB
+        run_size (int): rows per sorted run in pass 2
+    """
+    def __init__(self, aesthetic_extractor, technical_extractor, fusion=None, dedup=None,
+                 work_dir=None, batch_size=32, decode_workers=4, queue_size=64, run_size=100000):
+        self.aesthetic_extractor = aesthetic_extractor
+        self.technical_extractor = technical_extractor
+        self.fusion = fusion or FeatureFusion()
+        self.dedup = dedup
+        self.work_dir = work_dir
+        self.batch_size = batch_size
+        self.decode_workers = decode_workers
+        self.queue_size = queue_size
+        self.run_size = run_size
+        self.stats = None
+
+    # pass 1 ---------------------------------------------------------------
+
+    def _decode_stage(self, paths, out_q, stop):
+        """Decode on a thread pool with a bounded number of images in flight, until stop is set."""
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, self.decode_workers)) as pool:
+                inflight = []
+                for path in paths:
+                    if stop.is_set():
+                        break
+                    inflight.append((path, pool.submit(self.technical_extractor.decode, path)))
+                    if len(inflight) >= max(1, self.queue_size // 2):
+                        self._put_decoded(out_q, *inflight.pop(0))
+                for item in inflight:
+                    self._put_decoded(out_q, *item)
+        finally:
+            out_q.put(_DONE)
+
+    @staticmethod
+    def _put_decoded(out_q, path, fut):
+        try:
+            out_q.put((path, fut.result(), None))
+        except Exception as e:
+            out_q.put((path, None, e))
+
+    def _spill_stage(self, in_q, spill_path, stats, counts, failure):
+        """
+        Append rows to the spill file. An error (e.g. a full disk) is stored in
+        failure['error'] and the queue is drained to _DONE, so the producer
+        never blocks on a dead consumer.
+        """
+        try:
+            with open(spill_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=RAW_FIELDS)
+                writer.writeheader()
+                while True:
+                    METRICS.gauge('stream.spill_queue', in_q.qsize())
+                    rows = in_q.get()
+                    if rows is _DONE:
+                        return
+                    stats.update(rows)
+                    for row in rows:
+                        writer.writerow({k: row.get(k, '') for k in RAW_FIELDS})
+                    counts['spilled'] += len(rows)
+        except Exception as e:
+            logger.exception(f"Writing the spill file {spill_path} failed")
+            failure['error'] = e
+            while in_q.get() is not _DONE:
+                pass
+
+    def _extract_batch(self, batch):
+        """CLIP + technical features for decoded (path, image) pairs -> raw rows."""
+        rows = []
+        try:
+            with self.aesthetic_extractor.stage('preprocess'):
+                inputs = [self.aesthetic_extractor.preprocess(img.pil) for _, img in batch]
+            scores = self.aesthetic_extractor.score_preprocessed(inputs, [p for p, _ in batch])
+        except Exception as e:
+            for path, _ in batch:
+                logger.error(f"Feature extraction failed for {path}: {e}")
+            return rows
+        for (path, image), score in zip(batch, scores):
+            try:
+                features = {'aesthetic': float(score)}
+                features.update(self.technical_extractor.extract(image))
+                if self.dedup is not None:
+                    features['phash'] = self.dedup.hash_image(image)
+                features['path'] = path
+                features['file'] = path.split('/')[-1]
+                rows.append(features)
+            except Exception as e:
+                logger.error(f"Feature extraction failed for {path}: {e}")
+        return rows
+
+    def extract(self, paths, spill_path, progress=None):
+        """
+        Pass 1: stream paths through decode/extract/spill.
+
+        Returns:
+            FeatureStats: global normalization bounds of everything spilled
+
+        Raises:
+            RuntimeError if the spill file could not be written.
+        """
+        stats = FeatureStats()
+        counts = {'spilled': 0}
+        failure = {}
+        stop = threading.Event()
+        decoded_q = queue.Queue(maxsize=max(1, self.queue_size // 2))
+        spill_q = queue.Queue(maxsize=max(1, self.queue_size // self.batch_size))
+        decoder = threading.Thread(target=self._decode_stage, args=(paths, decoded_q, stop), daemon=True)
+        spiller = threading.Thread(target=self._spill_stage, args=(spill_q, spill_path, stats, counts, failure),
+                                   daemon=True)
+        decoder.start()
+        spiller.start()
+
+        batch = []
+        while True:
+            METRICS.gauge('stream.decoded_queue', decoded_q.qsize())
+            item = decoded_q.get()
+            if item is _DONE:
+                break
+            if failure:
+                # the spill is lost; stop decoding and drain what is in flight
+                stop.set()
+                batch = []
+                continue
+            path, image, error = item
+            if progress is not None:
+                progress.update(1)
+            if error is not None:
+                logger.error(f"Feature extraction failed for {path}: {error}")
+                continue
+            batch.append((path, image))
+            if len(batch) >= self.batch_size:
+                spill_q.put(self._extract_batch(batch))
+                batch = []
+        if batch and not failure:
+            spill_q.put(self._extract_batch(batch))
+        spill_q.put(_DONE)
+        decoder.join()
+        spiller.join()
+        if failure:
+            raise RuntimeError(f"Streaming extraction failed writing {spill_path}: {failure['error']}")
+        logger.info(f"Spilled features for {counts['spilled']} images to {spill_path}")
+        return stats
+
+    # pass 2 ---------------------------------------------------------------
+
+    def _write_run(self, rows, run_dir, run_paths, fieldnames):
+        rows.sort(key=lambda r: r['final_score'], reverse=True)  # stable: input order on ties
+        path = os.path.join(run_dir, f"run_{len(run_paths):05d}.csv")
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in rows:
+                writer.writerow({k: row.get(k, '') for k in fieldnames})
+        run_paths.append(path)
+
+    def rank(self, spill_path, stats, output_csv, fieldnames, topk=50):
+        """
+        Pass 2: normalize with global stats, write the externally sorted CSV.
+
+        Returns:
+            list of dict: the top-k rows, best first
+        """
+        run_dir = os.path.dirname(spill_path)
+        run_fields = list(dict.fromkeys(fieldnames + ['phash']))
+        run_paths, heap, chunk, seq = [], [], [], 0
+        for row in _read_rows(spill_path):
+            chunk.append(_parse_raw(row))
+            if len(chunk) >= self.run_size:
+                seq = self._fuse_chunk(chunk, stats, heap, topk, seq)
+                self._write_run(chunk, run_dir, run_paths, run_fields)
+                chunk = []
+        if chunk:
+            seq = self._fuse_chunk(chunk, stats, heap, topk, seq)
+            self._write_run(chunk, run_dir, run_paths, run_fields)
+
+        # heapq.merge keeps earlier runs first on ties, matching a stable full sort
+        readers = [_read_rows(p) for p in run_paths]
+        merged = heapq.merge(*readers, key=lambda r: -float(r['final_score']))
+        if self.dedup is not None:
+            # the top-k must come from the deduplicated stream
+            merged = self.dedup.iter_dedup(merged)
+            top = []
+            with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                for row in merged:
+                    if len(top) < topk:
+                        top.append(self._typed(row))
+                    writer.writerow({k: row.get(k, '') for k in fieldnames})
+            return top
+
+        with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            for row in merged:
+                writer.writerow({k: row.get(k, '') for k in fieldnames})
+        return [row for _, _, row in sorted(heap, key=lambda e: (-e[0], -e[1]))]
+
+    def _fuse_chunk(self, chunk, stats, heap, topk, seq):
+        """Fuse a chunk in place with global bounds and feed the top-k heap."""
+        self.fusion.fuse(chunk, stats)
+        for row in chunk:
+            # min-heap on (score, -seq): evicts the lowest score, latest first on ties
+            entry = (row['final_score'], -seq, row)
+            if len(heap) < topk:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+            seq += 1
+        return seq
+
+    @staticmethod
+    def _typed(row):
+        for k in ['final_score', 'aesthetic', 'sharpness_norm', 'exposure_norm', 'contrast_norm']:
+            row[k] = float(row[k])
+        row['face_present'] = int(row['face_present'])
+        return row
+
+    def run(self, paths, output_csv, fieldnames, topk=50, progress=None):
+        """
+        Rank paths end to end and write output_csv.
+
+        Returns:
+            list of dict: the top-k rows, best first
+        """
+        if self.work_dir:
+            os.makedirs(self.work_dir, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.work_dir) as tmp:
+            spill_path = os.path.join(tmp, 'spill.csv')
+            stats = self.stats = self.extract(paths, spill_path, progress=progress)
+            if stats.count == 0:
+                logger.error("No features extracted; nothing to rank")
+                return []
+            with METRICS.timer('stream.rank'):
+                return self.rank(spill_path, stats, output_csv, fieldnames, topk=topk)
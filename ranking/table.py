@@ -0,0 +1,216 @@
+import csv
+import numpy as np
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# known column dtypes; other columns are inferred
+SCHEMA = {
+    'file': str,
+    'path': str,
+    'index': np.int64,
+    'phash': str,  # decimal string: 64-bit unsigned hashes do not fit int64
+    'aesthetic': np.float64,
+    'sharpness': np.float64,
+    'exposure': np.float64,
+    'contrast': np.float64,
+    'faces': np.int64,
+    'sharpness_norm': np.float64,
+    'exposure_norm': np.float64,
+    'contrast_norm': np.float64,
+    'face_present': np.int64,
+    'final_score': np.float64
+}
+
+def _column(values, name):
+    dtype = SCHEMA.get(name)
+    if dtype is str:
+        return np.array(values, dtype=str)
+    if dtype is not None:
+        return np.asarray(values, dtype=dtype)
+    arr = np.asarray(values)
+    if arr.dtype.kind in 'OU':
+        try:
+            return arr.astype(np.float64)
+        except ValueError:
+            return arr.astype(str)
+    return arr
+
+class FeatureTable:
+    """
+    Columnar (struct-of-arrays) feature store: one NumPy array per column,
+    all of equal length. Fusion, normalization and sorting run as vectorized
+    operations on it, and it round-trips through NPZ or Parquet without
+    parsing text. CSV is kept as an export format.
+
+    Iterating yields one dict per row, so code written for lists of dicts
+    (e.g. evaluation.visualization) keeps working.
+    """
+    def __init__(self, columns=None):
+        self.columns = {}
+        for name, values in (columns or {}).items():
+            self[name] = values
+
+    @classmethod
+    def from_dicts(cls, dicts, columns=None):
+        """Build a table from a list of per-image dicts."""
+        dicts = list(dicts)
+        if columns is None:
+            columns = list(dict.fromkeys(k for d in dicts[:1] for k in d))
+        return cls({c: _column([d[c] for d in dicts], c) for c in columns})
+
+    def to_dicts(self):
+        """Rows as a list of dicts with native Python values."""
+        return list(self)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()))) if self.columns else 0
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, (int, np.integer)):
+            return {name: col[key].item() for name, col in self.columns.items()}
+        return self.take(key)
+
+    def __setitem__(self, name, values):
+        values = _column(values, name)
+        if self.columns and len(values) != len(self):
+            raise ValueError(f"Column {name} has {len(values)} rows, table has {len(self)}")
+        self.columns[name] = values
+
+    def __iter__(self):
+        names = list(self.columns)
+        for row in zip(*(self.columns[n].tolist() for n in names)):
+            yield dict(zip(names, row))
+
+    def take(self, indices):
+        """Rows selected by an index array, boolean mask or slice."""
+        return FeatureTable({name: col[indices] for name, col in self.columns.items()})
+
+    def sort_by(self, column, descending=True):
+        """Stable sort; rows with equal keys keep their current order."""
+        keys = self.columns[column]
+        order = np.argsort(-keys if descending else keys, kind='stable')
+        return self.take(order)
+
+    def head(self, k):
+        return self.take(slice(0, k))
+
+    @classmethod
+    def concat(cls, tables):
+        tables = [t for t in tables if len(t)]
+        if not tables:
+            return cls()
+        names = list(tables[0].columns)
+        return cls({n: np.concatenate([t.columns[n] for t in tables]) for n in names})
+
+    # persistence ----------------------------------------------------------
+
+    # column names are prefixed: np.savez reserves 'file' for its own argument
+    _NPZ_PREFIX = 'col:'
+
+    def save_npz(self, path):
+        np.savez(path, **{self._NPZ_PREFIX + name: col for name, col in self.columns.items()})
+
+    @classmethod
+    def load_npz(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name[len(cls._NPZ_PREFIX):]: data[name] for name in data.files})
+
+    def save_parquet(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet output requires pyarrow (pip install pyarrow)") from e
+        pq.write_table(pa.table(self.columns), path)
+
+    @classmethod
+    def load_parquet(cls, path):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet input requires pyarrow (pip install pyarrow)") from e
+        table = pq.read_table(path)
+        return cls({name: table.column(name).to_numpy() for name in table.column_names})
+
+    def save_csv(self, path, fieldnames=None):
+        fieldnames = fieldnames or list(self.columns)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(fieldnames)
+            writer.writerows(zip(*(self.columns[n].tolist() for n in fieldnames)))
+
+    @classmethod
+    def load_csv(cls, path):
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            cols = list(zip(*reader)) or [()] * len(header)
+        return cls({name: _column(list(values), name) for name, values in zip(header, cols)})
+
+    def save(self, path, fieldnames=None):
+        """Write by extension: .npz, .parquet or .csv (fieldnames only apply to CSV)."""
+        if path.endswith('.npz'):
+            self.save_npz(path)
+        elif path.endswith('.parquet'):
+            self.save_parquet(path)
+        else:
+            self.save_csv(path, fieldnames)
+
+    @classmethod
+    def load(cls, path):
+        """Read by extension: .npz, .parquet or .csv."""
+        if path.endswith('.npz'):
+            return cls.load_npz(path)
+        if path.endswith('.parquet'):
+            return cls.load_parquet(path)
+        return cls.load_csv(path)
+
+    @classmethod
+    def iter_chunks(cls, path, chunk_rows=100000, columns=None):
+        """
+        Yield a saved table as FeatureTables of at most chunk_rows rows, in
+        file order. CSV and Parquet are read incrementally; NPZ loads the
+        requested columns and slices them.
+
+        Args:
+            columns (list): optional subset of columns to read
+        """
+        if path.endswith('.npz'):
+            with np.load(path, allow_pickle=False) as data:
+                names = [n[len(cls._NPZ_PREFIX):] for n in data.files]
+                cols = {n: data[cls._NPZ_PREFIX + n] for n in (columns or names)}
+            table = cls(cols)
+            for start in range(0, len(table), chunk_rows):
+                yield table.take(slice(start, start + chunk_rows))
+        elif path.endswith('.parquet'):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError as e:
+                raise ImportError("Parquet input requires pyarrow (pip install pyarrow)") from e
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+                yield cls({name: batch.column(name).to_numpy(zero_copy_only=False)
+                           for name in batch.schema.names})
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                keep = [i for i, name in enumerate(header) if columns is None or name in columns]
+                rows = []
+                for row in reader:
+                    rows.append(row)
+                    if len(rows) >= chunk_rows:
+                        yield cls._from_rows(header, keep, rows)
+                        rows = []
+                if rows:
+                    yield cls._from_rows(header, keep, rows)
+
+    @classmethod
+    def _from_rows(cls, header, keep, rows):
+        cols = list(zip(*rows))
+        return cls({header[i]: _column(list(cols[i]), header[i]) for i in keep})
@@ -0,0 +1,31 @@
+import argparse
+from utils.io import iter_image_entries, write_manifest, manifest_delta
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+def main():
+    """
+    Walk an image tree once and write a manifest (path, size, mtime) that
+    run_ranking.py --manifest can use instead of listing directories.
+    With --since, also report what changed relative to an older manifest.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--output', required=True, help='manifest file to write')
+    parser.add_argument('--since', default=None, help='previous manifest to diff against')
+    parser.add_argument('--no_recursive', action='store_true')
+    args = parser.parse_args()
+
+    entries = list(iter_image_entries(args.input_dir, recursive=not args.no_recursive))
+    if args.since:
+        delta = manifest_delta(args.since, entries)
+        for kind in ['added', 'changed', 'removed']:
+            logger.info(f"{kind}: {len(delta[kind])}")
+            for path in delta[kind]:
+                print(f"{kind}\t{path}")
+    n = write_manifest(args.output, entries)
+    logger.info(f"Wrote {n} entries to {args.output}")
+
+if __name__ == '__main__':
+    main()
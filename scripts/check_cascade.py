@@ -0,0 +1,81 @@
+import argparse, time
+from config.config import working_resolution, face_mode
+from features.aesthetic import CLIPAestheticExtractor
+from features.technical import TechnicalFeatureExtractor
+from ranking.cascade import CascadeRanker
+from ranking.dedup import Deduplicator
+from ranking.fusion import FeatureFusion
+from ranking.sharding import rank_table
+from ranking.table import FeatureTable
+from utils.io import load_images_from_folder, image_path
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+def exhaustive(paths, aesthetic_extractor, technical_extractor, fusion, dedup, batch_size):
+    """Every image through CLIP and the technical features, ranked as run_ranking.py does."""
+    rows = []
+    for batch, aesthetic_batch in aesthetic_extractor.iter_batches(paths, batch_size=batch_size):
+        for image, aesthetic in zip(batch, aesthetic_batch):
+            try:
+                if aesthetic is None:
+                    raise RuntimeError("CLIP aesthetic unavailable")
+                features = dict(aesthetic)
+                features.update(technical_extractor.extract(image))
+                if dedup is not None:
+                    features['phash'] = dedup.hash_image(image)
+                features['path'] = image_path(image)
+                rows.append(features)
+            except Exception as e:
+                logger.error(f"Feature extraction failed for {image_path(image)}: {e}")
+    table = FeatureTable.from_dicts(rows, columns=['path', 'aesthetic', 'sharpness', 'exposure', 'contrast', 'faces'])
+    if dedup is not None:
+        table['phash'] = ['' if r.get('phash') is None else str(r['phash']) for r in rows]
+    return rank_table(table, fusion, dedup)
+
+def main():
+    """
+    Cascade ranking against the exhaustive run on a folder of images: for
+    each K, whether the top-K paths and scores are identical, and how many
+    CLIP evaluations the cascade saved.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--recursive', action='store_true')
+    parser.add_argument('--topk', type=int, nargs='+', default=[10, 50])
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--max_side', type=int, default=working_resolution)
+    parser.add_argument('--face_mode', choices=['exhaustive', 'fast'], default=face_mode)
+    parser.add_argument('--dedup', action='store_true')
+    args = parser.parse_args()
+
+    paths = load_images_from_folder(args.input_dir, recursive=args.recursive)
+    aesthetic_extractor = CLIPAestheticExtractor(device=args.device, max_side=args.max_side)
+    technical_extractor = TechnicalFeatureExtractor(max_side=args.max_side, face_mode=args.face_mode)
+    fusion = FeatureFusion()
+    dedup = Deduplicator(max_side=args.max_side) if args.dedup else None
+
+    t0 = time.perf_counter()
+    full = exhaustive(paths, aesthetic_extractor, technical_extractor, fusion, dedup, args.batch_size)
+    full_s = time.perf_counter() - t0
+    print(f"images: {len(paths)}  exhaustive: {full_s:.1f} s")
+
+    failures = 0
+    for k in args.topk:
+        ranker = CascadeRanker(aesthetic_extractor, technical_extractor, fusion, dedup, batch_size=args.batch_size)
+        t0 = time.perf_counter()
+        ranked = ranker.run(paths, k)
+        cascade_s = time.perf_counter() - t0
+        n = min(k, len(full))
+        same = (ranked['path'][:n].tolist() == full['path'][:n].tolist()
+                and ranked['final_score'][:n].tolist() == full['final_score'][:n].tolist())
+        failures += not same
+        report = ranker.report
+        print(f"top-{k}: {'identical' if same else 'DIFFERENT'}  CLIP evaluations {report['clip_evaluated']} "
+              f"of {report['images']} (saved {report['clip_skipped']})  cascade {cascade_s:.1f} s")
+    if failures:
+        raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse, time
+import numpy as np
+from config.config import cpu_inference
+from features.aesthetic import CLIPAestheticExtractor
+from features.technical import TechnicalFeatureExtractor
+from ranking.fusion import FeatureFusion
+from evaluation.agreement import spearman, topk_overlap
+from utils.io import load_images_from_folder, load_decoded
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+def timed_scores(extractor, images, batch_size):
+    t0 = time.perf_counter()
+    results = extractor.extract_batch(images, batch_size=batch_size)
+    return time.perf_counter() - t0, results
+
+def main():
+    """
+    Accuracy and speed check of the optimized CPU inference mode
+    (config.cpu_inference) against the fp32 baseline on a folder of images:
+    aesthetic score deltas, rank correlation of aesthetic and final scores,
+    and top-k agreement.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--topk', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--compile', action='store_true')
+    args = parser.parse_args()
+
+    paths = load_images_from_folder(args.input_dir)[:args.limit]
+    images = [load_decoded(p) for p in paths]  # decode once, outside the timings
+
+    opts = dict(cpu_inference, compile=args.compile or cpu_inference.get('compile', False))
+    if args.threads:
+        opts['intra_op_threads'] = args.threads
+    baseline = CLIPAestheticExtractor(device='cpu')
+    optimized = CLIPAestheticExtractor(device='cpu', cpu_opt=opts)
+
+    optimized.extract_batch(images[:args.batch_size], batch_size=args.batch_size)  # warm-up (compile)
+    base_s, base = timed_scores(baseline, images, args.batch_size)
+    opt_s, opt = timed_scores(optimized, images, args.batch_size)
+
+    keep = [i for i in range(len(images)) if base[i] is not None and opt[i] is not None]
+    a_base = np.array([base[i]['aesthetic'] for i in keep])
+    a_opt = np.array([opt[i]['aesthetic'] for i in keep])
+    delta = np.abs(a_opt - a_base)
+
+    technical = TechnicalFeatureExtractor()
+    tech = [technical.extract(images[i]) for i in keep]
+    fusion = FeatureFusion()
+    final_base = np.array([fd['final_score'] for fd in fusion.fuse([dict(t, aesthetic=a) for t, a in zip(tech, a_base)])])
+    final_opt = np.array([fd['final_score'] for fd in fusion.fuse([dict(t, aesthetic=a) for t, a in zip(tech, a_opt)])])
+
+    print(f"images: {len(keep)}  options: {opts}")
+    print(f"CLIP time: fp32 {1000 * base_s / len(images):.1f} ms/img, optimized {1000 * opt_s / len(images):.1f} ms/img "
+          f"-> {base_s / opt_s:.2f}x")
+    print(f"aesthetic |delta|: mean {delta.mean():.5f}  p95 {np.percentile(delta, 95):.5f}  max {delta.max():.5f}")
+    print(f"spearman aesthetic: {spearman(a_base, a_opt):.4f}  final_score: {spearman(final_base, final_opt):.4f}")
+    print(f"top-{args.topk} overlap (final_score): {topk_overlap(final_base, final_opt, args.topk):.3f}")
+
+if __name__ == '__main__':
+    main()
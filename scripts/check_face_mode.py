@@ -0,0 +1,64 @@
+import argparse, time
+from features.technical import TechnicalFeatureExtractor
+from utils.io import load_images_from_folder, load_decoded
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+def timed_presence(extractor, grays):
+    t0 = time.perf_counter()
+    present = [int(extractor._face_count(g) > 0) for g in grays]
+    return time.perf_counter() - t0, present
+
+def main():
+    """
+    Validation of the fast face mode against the exhaustive detector on a
+    folder of images: face_present agreement, a confusion table, the images
+    where the modes disagree, and the detection speedup.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--recursive', action='store_true')
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--max_side', type=int, default=None,
+                        help='working resolution the ranking runs at (default native)')
+    parser.add_argument('--show', type=int, default=20, help='disagreeing images to list')
+    args = parser.parse_args()
+
+    paths = load_images_from_folder(args.input_dir, recursive=args.recursive)[:args.limit]
+    grays, kept = [], []
+    for p in paths:  # decode once, outside the timings
+        try:
+            grays.append(load_decoded(p, args.max_side).gray)
+            kept.append(p)
+        except Exception as e:
+            logger.error(f"Failed to load {p}: {e}")
+    if not grays:
+        print("No images to compare")
+        return
+
+    exhaustive_s, exhaustive = timed_presence(TechnicalFeatureExtractor(face_mode='exhaustive'), grays)
+    fast_s, fast = timed_presence(TechnicalFeatureExtractor(face_mode='fast'), grays)
+
+    n = len(grays)
+    both = sum(1 for e, f in zip(exhaustive, fast) if e and f)
+    only_e = sum(1 for e, f in zip(exhaustive, fast) if e and not f)
+    only_f = sum(1 for e, f in zip(exhaustive, fast) if f and not e)
+    neither = n - both - only_e - only_f
+    agree = (both + neither) / n
+
+    print(f"images: {n}  max_side: {args.max_side or 'native'}")
+    print(f"face detection: exhaustive {1000 * exhaustive_s / n:.1f} ms/img, fast {1000 * fast_s / n:.1f} ms/img "
+          f"-> {exhaustive_s / max(fast_s, 1e-9):.2f}x")
+    print(f"face_present agreement: {agree:.3f}")
+    print(f"{'':>16}{'fast=1':>10}{'fast=0':>10}")
+    print(f"{'exhaustive=1':>16}{both:>10}{only_e:>10}")
+    print(f"{'exhaustive=0':>16}{only_f:>10}{neither:>10}")
+    if both + only_e:
+        print(f"recall vs exhaustive: {both / (both + only_e):.3f}")
+    disagree = [(p, e, f) for p, e, f in zip(kept, exhaustive, fast) if e != f]
+    for p, e, f in disagree[:args.show]:
+        print(f"  exhaustive={e} fast={f}  {p}")
+
+if __name__ == '__main__':
+    main()
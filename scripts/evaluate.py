@@ -1,34 +1,65 @@
-import csv, os
+import os
 import argparse
 from config.config import base_csv_dir
-from evaluation.proxy_metrics import ProxyEvaluator
-from evaluation.visualization import plot_score_distribution, show_topk_images
+from evaluation.proxy_metrics import ProxyEvaluator, ProxyAccumulator
+from evaluation.visualization import plot_score_distribution, export_topk, contact_sheets
+from ranking.table import FeatureTable
+
+EVAL_COLUMNS = ['file', 'path', 'final_score', 'sharpness_norm', 'aesthetic']
 
 parser = argparse.ArgumentParser()
-parser.add_argument('--input_csv', required=True)
+parser.add_argument('--input_csv', default=None, help='ranking output: .csv, .npz or .parquet')
+parser.add_argument('--topk', type=int, default=10, help='images to export for review')
+parser.add_argument('--thumb_side', type=int, default=0,
+                    help='export bounded JPEG thumbnails of this long side (default 0: link/copy the originals)')
+parser.add_argument('--contact_sheet', action='store_true', help='also tile the top-K into contact sheets')
+parser.add_argument('--sheet_cols', type=int, default=10)
+parser.add_argument('--sheet_rows', type=int, default=10)
+parser.add_argument('--tile', type=int, default=192, help='contact sheet thumbnail size')
+parser.add_argument('--workers', type=int, default=8)
+parser.add_argument('--chunk_rows', type=int, default=0,
+                    help='stream the ranking in chunks of this many rows (no score histogram)')
+parser.add_argument('--bootstrap', type=int, default=0, help='Poisson bootstrap replicates for confidence intervals')
+parser.add_argument('--seed', type=int, default=0, help='bootstrap seed; use a different one per shard')
+parser.add_argument('--save_state', default=None, help='write the metric accumulator (.npz) for --merge_states')
+parser.add_argument('--merge_states', nargs='+', default=None,
+                    help='combine accumulators saved from shards with --save_state and print their metrics')
 args = parser.parse_args()
 
-input_csv = os.path.join(base_csv_dir, args.input_csv)
-
-ranked_list = []
-with open(input_csv, newline='', encoding='utf-8') as f:
-    reader = csv.DictReader(f)
-    for row in reader:
-        ranked_list.append({
-            'file': row['file'],
-            'path': row['path'],
-            'final_score': float(row['final_score']),
-            'aesthetic': float(row['aesthetic']),
-            'sharpness_norm': float(row['sharpness_norm']),
-            'exposure_norm': float(row['exposure_norm']),
-            'contrast_norm': float(row['contrast_norm']),
-            'face_present': int(row['face_present'])
-        })
+if args.merge_states:
+    acc = ProxyAccumulator.load(args.merge_states[0])
+    for path in args.merge_states[1:]:
+        acc = acc.merge(ProxyAccumulator.load(path))
+    print("Proxy metrics:", acc.result())
+    raise SystemExit(0)
+if args.input_csv is None:
+    parser.error('--input_csv is required unless --merge_states is given')
 
+input_csv = os.path.join(base_csv_dir, args.input_csv)
+folder_name = os.path.basename(input_csv)
+save_dir = f'./output/topk_images/{folder_name}'
 proxy_eval = ProxyEvaluator()
-metrics = proxy_eval.evaluate(ranked_list)
-print("Proxy metrics:", metrics)
 
-folder_name = os.path.basename(input_csv)
-plot_score_distribution(ranked_list, output_path=f'./results/{folder_name}.png')
-show_topk_images(ranked_list, k=10, save_dir=f'./output/topk_images/{folder_name}')
+if args.chunk_rows or args.bootstrap or args.save_state:
+    # the ranking is sorted best-first, so the top-K is the start of the first chunks
+    head = []
+    def chunks():
+        for chunk in FeatureTable.iter_chunks(input_csv, args.chunk_rows or 100000, columns=EVAL_COLUMNS):
+            if sum(len(h) for h in head) < args.topk:
+                head.append(chunk.head(args.topk))
+            yield chunk
+    metrics, acc = proxy_eval.evaluate_stream(chunks(), bootstrap=args.bootstrap, seed=args.seed)
+    print("Proxy metrics:", metrics)
+    if args.save_state:
+        acc.save(args.save_state)
+    ranked = FeatureTable.concat(head).head(args.topk)
+else:
+    ranked = FeatureTable.load(input_csv)
+    metrics = proxy_eval.evaluate_table(ranked)
+    print("Proxy metrics:", metrics)
+    plot_score_distribution(ranked, output_path=f'./results/{folder_name}.png')
+
+export_topk(ranked, k=args.topk, save_dir=save_dir, max_side=args.thumb_side or None, workers=args.workers)
+if args.contact_sheet:
+    contact_sheets(ranked, k=args.topk, save_dir=save_dir, cols=args.sheet_cols, rows=args.sheet_rows,
+                   tile=args.tile, workers=args.workers)
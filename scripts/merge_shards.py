@@ -0,0 +1,48 @@
+import argparse, os
+from config.config import working_resolution
+from ranking.fusion import FeatureFusion
+from ranking.dedup import Deduplicator
+from ranking.sharding import load_shards, rank_table
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+FIELDNAMES = ['file','path','final_score','aesthetic','sharpness_norm','exposure_norm','contrast_norm','face_present']
+
+def main():
+    """
+    Merge the shards written by run_ranking.py --shard I/N: global
+    normalization from the merged partial stats, fusion, sort and optional
+    dedup. The output is identical to a single-node run_ranking.py run.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shard_dir', default='./output/shards')
+    parser.add_argument('--output', default=None, help='default: ./output/csvs/<input>.<format>')
+    parser.add_argument('--format', choices=['csv', 'npz', 'parquet'], default='csv')
+    parser.add_argument('--topk', type=int, default=50)
+    parser.add_argument('--max_side', type=int, default=working_resolution,
+                        help='working resolution for missing pHashes, for shards that do not record theirs')
+    parser.add_argument('--save_stats', default=None, help='write the merged normalization bounds (JSON)')
+    args = parser.parse_args()
+
+    table, stats, meta = load_shards(args.shard_dir)
+    if len(table) < meta['total_images']:
+        logger.warning(f"{meta['total_images'] - len(table)} of {meta['total_images']} images failed in the shards")
+    # missing pHashes are recomputed at the shards' working resolution, as a single-node run would
+    max_side = meta['max_side'] if 'max_side' in meta else args.max_side
+    dedup = Deduplicator(max_side=max_side) if meta['dedup'] else None
+    ranked = rank_table(table, FeatureFusion(), dedup, stats=stats)
+    if args.save_stats:
+        stats.save(args.save_stats)
+
+    output = args.output or f"./output/csvs/{meta['input']}.{args.format}"
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    ranked.save(output, FIELDNAMES)
+    logger.info(f"Saved merged ranking to {output}")
+
+    print(f"Top {args.topk} images:")
+    for i, r in enumerate(ranked.head(args.topk), 1):
+        print(f"{i:03d}. {r['file']}  score={r['final_score']:.4f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,28 @@
+import argparse
+from utils.archive import pack_shards
+from utils.io import load_images_from_folder
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+def main():
+    """
+    Pack a folder of images into tar or zip shards for sequential ingestion
+    with run_ranking.py --archives.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--output_dir', required=True)
+    parser.add_argument('--format', choices=['tar', 'zip'], default='tar')
+    parser.add_argument('--shard_mb', type=float, default=1024, help='target shard size')
+    parser.add_argument('--max_files', type=int, default=None, help='optional cap on images per shard')
+    parser.add_argument('--recursive', action='store_true')
+    args = parser.parse_args()
+
+    paths = load_images_from_folder(args.input_dir, recursive=args.recursive)
+    shards = pack_shards(paths, args.output_dir, args.input_dir, fmt=args.format,
+                         max_bytes=int(args.shard_mb * 1024 * 1024), max_files=args.max_files)
+    logger.info(f"Packed {len(paths)} images into {len(shards)} shards in {args.output_dir}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse, csv, os
+import numpy as np
+from config.config import embedding_store_dir
+from features.aesthetic import CLIPAestheticExtractor
+from features.embedding_store import EmbeddingStore
+from ranking.fusion import FeatureFusion
+from utils.io import save_csv
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+FIELDNAMES = ['file','path','final_score','aesthetic','sharpness_norm','exposure_norm','contrast_norm','face_present']
+
+def main():
+    """
+    Re-rank an existing ranking CSV after the prompts in config/config.py change.
+
+    Only the new prompts go through CLIP; aesthetic scores come from the stored
+    image embeddings (run_ranking.py --store_embeddings) with one matmul, and
+    final_score is recomputed from the unchanged normalized technical features.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_csv', required=True)
+    parser.add_argument('--output_csv', default=None, help='defaults to <input>_rescored.csv')
+    parser.add_argument('--embedding_store', default=embedding_store_dir)
+    parser.add_argument('--device', default='cpu')
+    args = parser.parse_args()
+
+    store = EmbeddingStore(args.embedding_store)
+    logger.info(f"Embedding store encoder settings: {store.encoder}")
+    extractor = CLIPAestheticExtractor(device=args.device)
+    aesthetic = extractor.rescore_store(store)
+    logger.info(f"Rescored {len(aesthetic)} stored embeddings")
+
+    with open(args.input_csv, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+
+    fusion = FeatureFusion()
+    keys = list(FeatureFusion.WEIGHT_COLUMNS)
+    w = np.array([fusion.weights.get(k, 0) for k in keys])
+    missing = 0
+    for row in rows:
+        if row['path'] in aesthetic:
+            row['aesthetic'] = aesthetic[row['path']]
+        else:
+            missing += 1
+        x = np.array([float(row[FeatureFusion.WEIGHT_COLUMNS[k]]) for k in keys])
+        row['final_score'] = float(x @ w)
+    if missing:
+        logger.warning(f"{missing} images have no stored embedding and keep their old aesthetic score")
+
+    ranked = sorted(rows, key=lambda x: x['final_score'], reverse=True)
+    output_csv = args.output_csv or os.path.splitext(args.input_csv)[0] + '_rescored.csv'
+    save_csv(output_csv, ranked, FIELDNAMES)
+    logger.info(f"Saved rescored ranking CSV to {output_csv}")
+
+if __name__ == '__main__':
+    main()
@@ -1,60 +1,345 @@
-import argparse, os
-from config.config import base_input_dir
+import argparse, cProfile, os, pstats
+from config.config import base_input_dir, feature_cache_path, feature_cache_max_mb, embedding_store_dir, working_resolution, cpu_inference, face_mode
 from features.aesthetic import CLIPAestheticExtractor
 from features.technical import TechnicalFeatureExtractor
-from ranking.fusion import FeatureFusion
+from features.embedding_store import EmbeddingStore
+from ranking.fusion import FeatureFusion, FeatureStats
 from ranking.dedup import Deduplicator
-from utils.io import load_images_from_folder, save_csv
+from ranking.streaming import StreamingRanker
+from ranking.cascade import CascadeRanker
+from ranking.sharding import parse_shard, select_shard, save_shard, rank_table
+from ranking.table import FeatureTable
+from utils.io import load_images_from_folder, read_manifest, image_path
+from utils.archive import find_archives, list_archive, iter_archive_images
+from utils.parallel import TechnicalPool, ClipPool
+from utils.cache import FeatureCache, feature_fingerprint
 from utils.logging import get_logger
+from utils.metrics import METRICS
 import tqdm
 
 logger = get_logger(__name__)
 
+RAW_FEATURES = ['aesthetic', 'sharpness', 'exposure', 'contrast', 'faces']
+FIELDNAMES = ['file','path','final_score','aesthetic','sharpness_norm','exposure_norm','contrast_norm','face_present']
+
+def print_topk(ranked, topk):
+    print(f"Top {topk} images:")
+    for i, r in enumerate(ranked[:topk],1):
+        print(f"{i:03d}. {r['file']}  score={r['final_score']:.4f} aest={r['aesthetic']:.3f} sharp={r['sharpness_norm']:.3f} exp={r['exposure_norm']:.3f} ctr={r['contrast_norm']:.3f} faces={r['face_present']}")
+
+def extract_serial(image_paths, aesthetic_extractor, technical_extractor, dedup, args, images=None):
+    """
+    CLIP and technical features (and pHash if dedup is given) in this process, sharing one decode per image.
+    images optionally replaces image_paths as the source, e.g. an archive stream of ImageBuffers.
+    """
+    feature_list = []
+    with tqdm.tqdm(total=len(image_paths), desc="Extracting features") as pbar:
+        batches = aesthetic_extractor.iter_batches(
+            image_paths if images is None else images, batch_size=args.batch_size, num_workers=args.num_workers)
+        for batch, aesthetic_batch in batches:
+            # batch holds the decoded images, shared with the technical extractor
+            for image, aesthetic in zip(batch, aesthetic_batch):
+                path = image_path(image)
+                try:
+                    if aesthetic is None:
+                        raise RuntimeError("CLIP aesthetic unavailable")
+                    features = dict(aesthetic)
+                    features.update(technical_extractor.extract(image))
+                    if dedup is not None:
+                        features['phash'] = dedup.hash_image(image)
+                    features['path'] = path
+                    features['file'] = path.split('/')[-1]
+                    feature_list.append(features)
+                except Exception as e:
+                    logger.error(f"Feature extraction failed for {path}: {e}")
+            pbar.update(len(batch))
+    return feature_list
+
+def extract_parallel(image_paths, aesthetic_extractor, args):
+    """
+    Decoding and technical features on a process pool; CLIP inference on the
+    workers' preprocessed tensors in this process. Input order is preserved.
+    """
+    feature_list = []
+
+    def flush(pending):
+        try:
+            scores = aesthetic_extractor.score_preprocessed([clip_input for _, _, clip_input in pending],
+                                                            [path for path, _, _ in pending])
+        except Exception as e:
+            for path, _, _ in pending:
+                logger.error(f"Feature extraction failed for {path}: {e}")
+            return
+        for (path, features, _), score in zip(pending, scores):
+            features['aesthetic'] = float(score)
+            features['path'] = path
+            features['file'] = path.split('/')[-1]
+            feature_list.append(features)
+
+    with TechnicalPool(args.workers, preprocess=aesthetic_extractor.preprocess,
+                       phash=args.dedup, max_side=args.max_side, face_mode=args.face_mode,
+                       chunksize=args.chunksize) as pool, \
+         tqdm.tqdm(total=len(image_paths), desc="Extracting features") as pbar:
+        pending = []
+        for path, features, clip_input, error in pool.imap(image_paths):
+            pbar.update(1)
+            if error is not None:
+                logger.error(f"Feature extraction failed for {path}: {error}")
+                continue
+            pending.append((path, features, clip_input))
+            if len(pending) >= args.batch_size:
+                flush(pending)
+                pending = []
+        if pending:
+            flush(pending)
+    return feature_list
+
+def extract_clip_pool(image_paths, aesthetic_extractor, args):
+    """
+    Whole extraction, CLIP included, on a process pool sharing this process's
+    CLIP weights. Input order is preserved.
+    """
+    feature_list = []
+    with ClipPool(args.clip_workers, aesthetic_extractor, phash=args.dedup, max_side=args.max_side,
+                  face_mode=args.face_mode, threads=args.threads, chunksize=args.batch_size) as pool, \
+         tqdm.tqdm(total=len(image_paths), desc="Extracting features") as pbar:
+        for path, features, error in pool.imap(image_paths):
+            pbar.update(1)
+            if error is not None:
+                logger.error(f"Feature extraction failed for {path}: {error}")
+                continue
+            features['path'] = path
+            features['file'] = path.split('/')[-1]
+            feature_list.append(features)
+        for line in pool.memory_summary():
+            logger.info(line)
+    return feature_list
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--input_dir', default=None)
+    parser.add_argument('--archives', nargs='+', default=None,
+                        help='read images from tar/zip shards (files or folders of shards) instead of input_dir')
     parser.add_argument('--output', default='ranked.csv')
+    parser.add_argument('--output_path', default=None,
+                        help='ranking file to write (format by extension); default: ./output/csvs/<input>.<format>')
+    parser.add_argument('--format', choices=['csv', 'npz', 'parquet'], default='csv',
+                        help='ranking output format; npz/parquet keep every column and reload without parsing')
     parser.add_argument('--topk', type=int, default=50)
     parser.add_argument('--device', default='cpu')
+    parser.add_argument('--batch_size', type=int, default=32)
+    parser.add_argument('--cpu_opt', action='store_true',
+                        help='int8/threaded/compiled CLIP inference (config.cpu_inference)')
+    parser.add_argument('--threads', type=int, default=None, help='torch intra-op threads for --cpu_opt, or per process with --clip_workers')
+    parser.add_argument('--num_workers', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=0,
+                        help='processes for decoding + technical features (0 = in-process)')
+    parser.add_argument('--chunksize', type=int, default=16)
+    parser.add_argument('--clip_workers', type=int, default=0,
+                        help='processes running the whole extraction, CLIP included, on shared model weights')
+    parser.add_argument('--recursive', action='store_true', help='include images in subfolders')
+    parser.add_argument('--manifest', default=None,
+                        help='read image paths from a manifest (scripts/build_manifest.py) instead of listing input_dir')
+    parser.add_argument('--max_side', type=int, default=working_resolution,
+                        help='working resolution: decode and analyse images at this long side (default native)')
+    parser.add_argument('--face_mode', choices=['exhaustive', 'fast'], default=face_mode,
+                        help='fast: face presence on a downscaled frame with early exit')
+    parser.add_argument('--dedup', action='store_true', help='drop near-duplicates (pHash) from the ranking')
+    parser.add_argument('--store_embeddings', action='store_true',
+                        help='persist CLIP image embeddings for scripts/rescore_prompts.py')
+    parser.add_argument('--embedding_store', default=embedding_store_dir)
+    parser.add_argument('--no_cache', action='store_true', help='recompute every image')
+    parser.add_argument('--cache_path', default=feature_cache_path)
+    parser.add_argument('--cache_max_mb', type=float, default=feature_cache_max_mb)
+    parser.add_argument('--save_stats', default=None,
+                        help='write the normalization bounds (JSON) for scripts/serve.py --stats')
+    parser.add_argument('--stream', action='store_true',
+                        help='bounded-memory two-pass mode with on-disk spill and external sort (CSV output, no feature cache)')
+    parser.add_argument('--work_dir', default=None, help='spill directory for --stream (default: system temp)')
+    parser.add_argument('--cascade', action='store_true',
+                        help='technical features first; CLIP only for images that can still reach the top-k (no feature cache)')
+    parser.add_argument('--shard', default=None,
+                        help='I/N: extract shard I of N and write raw features + partial stats for scripts/merge_shards.py')
+    parser.add_argument('--shard_by', choices=['hash', 'range'], default='hash')
+    parser.add_argument('--shard_dir', default='./output/shards')
+    parser.add_argument('--metrics_json', default=None, help='write per-stage latencies, counters and queue depths (JSON)')
+    parser.add_argument('--metrics_prom', default=None, help='write the same metrics as a Prometheus text file')
+    parser.add_argument('--profile', default=None, help='run under cProfile and write the stats to this file')
     args = parser.parse_args()
-    
-    input_dir = os.path.join(base_input_dir, args.input_dir)
-    folder_name = os.path.basename(args.input_dir)
-    output_csv = f"./output/csvs/{folder_name}.csv"
+    if not args.input_dir and not args.archives:
+        parser.error('one of --input_dir or --archives is required')
+    if args.clip_workers and (args.workers or args.store_embeddings):
+        parser.error('--clip_workers cannot be combined with --workers or --store_embeddings')
+    if args.stream and args.format != 'csv':
+        parser.error('--stream writes CSV only (its external sort merges CSV runs); drop --format')
+    if args.cascade and (args.stream or args.shard or args.clip_workers):
+        parser.error('--cascade cannot be combined with --stream, --shard or --clip_workers')
+
+    if args.profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(rank, args)
+        finally:
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+            logger.info(f"Saved cProfile stats to {args.profile}")
+    else:
+        rank(args)
+
+    print(METRICS.summary())
+    if args.metrics_json:
+        METRICS.save_json(args.metrics_json)
+    if args.metrics_prom:
+        METRICS.save_prometheus(args.metrics_prom)
+
+def rank(args):
+    """The ranking run configured by main()'s arguments."""
+    if args.archives:
+        first = os.path.normpath(args.archives[0])
+        folder_name = os.path.basename(first if os.path.isdir(first) else os.path.dirname(os.path.abspath(first)))
+    else:
+        input_dir = os.path.join(base_input_dir, args.input_dir)
+        folder_name = os.path.basename(args.input_dir)
+    output_csv = args.output_path or f"./output/csvs/{folder_name}.{args.format}"
 
-    logger.info(f"Starting ranking on {args.input_dir}")
+    logger.info(f"Starting ranking on {args.input_dir or args.archives}")
 
-    aesthetic_extractor = CLIPAestheticExtractor(device=args.device)
-    technical_extractor = TechnicalFeatureExtractor()
+    cpu_opt = None
+    if args.cpu_opt:
+        cpu_opt = dict(cpu_inference)
+        if args.threads:
+            cpu_opt['intra_op_threads'] = args.threads
+    aesthetic_extractor = CLIPAestheticExtractor(device=args.device, max_side=args.max_side, cpu_opt=cpu_opt)
+    store = None
+    if args.store_embeddings:
+        store = aesthetic_extractor.embedding_store = EmbeddingStore(
+            args.embedding_store, model_name=aesthetic_extractor.model_name,
+            encoder=aesthetic_extractor.encoder_config())
+    technical_extractor = TechnicalFeatureExtractor(max_side=args.max_side, face_mode=args.face_mode)
     fusion = FeatureFusion()
-    dedup = Deduplicator()
+    dedup = Deduplicator(max_side=args.max_side) if args.dedup else None
 
-    image_paths = load_images_from_folder(input_dir)
-    feature_list = []
+    shards = None
+    if args.archives:
+        shards = find_archives(args.archives)
+        image_paths = [ref for shard in shards for ref in list_archive(shard)]
+        logger.info(f"{len(image_paths)} images in {len(shards)} archive shards")
+    elif args.manifest:
+        image_paths = [e.path for e in read_manifest(args.manifest)]
+    else:
+        image_paths = load_images_from_folder(input_dir, recursive=args.recursive)
+    input_index, total_images = None, len(image_paths)
+    if args.shard:
+        shard, num_shards = parse_shard(args.shard)
+        selected = select_shard(image_paths, shard, num_shards, by=args.shard_by)
+        logger.info(f"Shard {shard}/{num_shards} ({args.shard_by}): {len(selected)} of {len(image_paths)} images")
+        input_index = {p: i for i, p in selected}
+        image_paths = [p for _, p in selected]
 
-    for path in tqdm.tqdm(image_paths, desc="Extracting features"):
-        try:
-            features = {}
-            features.update(aesthetic_extractor.extract(path))
-            features.update(technical_extractor.extract(path))
-            features['path'] = path
-            features['file'] = path.split('/')[-1]
-            feature_list.append(features)
-        except Exception as e:
-            logger.error(f"Feature extraction failed for {path}: {e}")
+    if args.stream and args.shard:
+        logger.warning("--stream is ignored with --shard: shards always write raw features for the merge")
+    elif args.stream:
+        ranker = StreamingRanker(aesthetic_extractor, technical_extractor,
+                                 fusion, dedup, work_dir=args.work_dir, batch_size=args.batch_size,
+                                 decode_workers=args.num_workers)
+        with tqdm.tqdm(total=len(image_paths), desc="Extracting features") as pbar, METRICS.timer('pipeline.total'):
+            top = ranker.run(image_paths, output_csv, FIELDNAMES, topk=args.topk, progress=pbar)
+        if store is not None:
+            store.flush()
+        if args.save_stats and ranker.stats is not None:
+            ranker.stats.save(args.save_stats)
+        logger.info(f"Saved ranking CSV to {output_csv}")
+        print_topk(top, args.topk)
+        return
 
-    fused = fusion.fuse(feature_list)
+    if args.cascade:
+        ranker = CascadeRanker(aesthetic_extractor, technical_extractor, fusion, dedup,
+                               batch_size=args.batch_size, num_workers=args.num_workers)
+        pool = None
+        if args.workers > 0:
+            pool = TechnicalPool(args.workers, phash=args.dedup, max_side=args.max_side,
+                                 face_mode=args.face_mode, chunksize=args.chunksize)
+        with tqdm.tqdm(total=len(image_paths), desc="Technical features") as pbar, METRICS.timer('pipeline.total'):
+            ranked = ranker.run(image_paths, args.topk, pool=pool, progress=pbar)
+        if pool is not None:
+            pool.close()
+        if store is not None:
+            store.flush()
+        report = ranker.report
+        print(f"Cascade: CLIP evaluations {report['clip_evaluated']} of {report['images']} "
+              f"(saved {report['clip_skipped']}); first {len(ranked)} rows match the exhaustive ranking")
+        ranked.save(output_csv, FIELDNAMES)
+        logger.info(f"Saved ranking to {output_csv}")
+        print_topk(ranked.head(args.topk).to_dicts(), args.topk)
+        return
 
-    # deduped = dedup.dedup(fused)
-    ranked = sorted(fused, key=lambda x: x['final_score'], reverse=True)
+    fingerprint = feature_fingerprint(aesthetic_extractor.cache_key(),
+                                      technical_extractor.cache_key(),
+                                      {'max_side': args.max_side})
+    cache, cached = None, {}
+    todo = image_paths
+    if shards is not None and not args.no_cache:
+        logger.info("Feature cache is not used for archive input")
+    elif not args.no_cache:
+        cache = FeatureCache(args.cache_path, fingerprint,
+                             max_bytes=int(args.cache_max_mb * 1024 * 1024))
+        cached, todo = cache.lookup(image_paths)
+        if store is not None:
+            # cached images still need one encode to enter the embedding store
+            missing = {p for p in cached if p not in store}
+            cached = {p: f for p, f in cached.items() if p not in missing}
+            todo = [p for p in image_paths if p in missing or p not in cached]
 
-    fieldnames = ['file','path','final_score','aesthetic','sharpness_norm','exposure_norm','contrast_norm','face_present']
-    save_csv(output_csv, ranked, fieldnames)
-    logger.info(f"Saved ranking CSV to {args.output}")
+    with METRICS.timer('extract.total'):
+        if args.clip_workers > 0:
+            computed = extract_clip_pool(todo, aesthetic_extractor, args)
+        elif args.workers > 0:
+            computed = extract_parallel(todo, aesthetic_extractor, args)
+        else:
+            images = None
+            if shards is not None:
+                # sequential member stream; only this run's (e.g. shard) images are decoded
+                wanted = set(todo)
+                images = (buf for buf in iter_archive_images(shards) if buf.path in wanted)
+            computed = extract_serial(todo, aesthetic_extractor, technical_extractor, dedup, args, images=images)
 
-    print(f"Top {args.topk} images:")
-    for i, r in enumerate(ranked[:args.topk],1):
-        print(f"{i:03d}. {r['file']}  score={r['final_score']:.4f} aest={r['aesthetic']:.3f} sharp={r['sharpness_norm']:.3f} exp={r['exposure_norm']:.3f} ctr={r['contrast_norm']:.3f} faces={r['face_present']}")
+    if cache is not None:
+        cache.put_many((fd['path'], {k: fd[k] for k in RAW_FEATURES + ['phash'] if k in fd})
+                       for fd in computed)
+        cache.close()
+    if store is not None:
+        store.flush()
+
+    # reassemble in input order
+    by_path = {fd['path']: fd for fd in computed}
+    for path, raw in cached.items():
+        by_path[path] = dict(raw, path=path, file=path.split('/')[-1])
+    feature_list = [by_path[p] for p in image_paths if p in by_path]
+
+    METRICS.inc('pipeline.images', len(image_paths))
+    METRICS.inc('pipeline.failures', len(todo) - len(computed))
+    table = FeatureTable.from_dicts(feature_list, columns=['file', 'path'] + RAW_FEATURES)
+    if dedup is not None:
+        table['phash'] = ['' if fd.get('phash') is None else str(fd['phash']) for fd in feature_list]
+
+    if input_index is not None:
+        table['index'] = [input_index[p] for p in table['path'].tolist()]
+        # everything the shards of one run must agree on
+        meta = {'input': folder_name, 'shard_by': args.shard_by, 'total_images': total_images,
+                'fingerprint': fingerprint, 'dedup': dedup is not None, 'max_side': args.max_side}
+        save_shard(args.shard_dir, shard, num_shards, table, meta)
+        return
+
+    if args.save_stats:
+        FeatureStats().update_columns(table).save(args.save_stats)
+    with METRICS.timer('fusion'):
+        ranked = rank_table(table, fusion, dedup)
+
+    with METRICS.timer('write'):
+        ranked.save(output_csv, FIELDNAMES)
+    logger.info(f"Saved ranking to {output_csv}")
+
+    print_topk(ranked.head(args.topk).to_dicts(), args.topk)
 
 if __name__ == '__main__':
     main()
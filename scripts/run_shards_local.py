@@ -0,0 +1,52 @@
+import argparse, filecmp, os, subprocess, sys, tempfile
+from utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+
+def main():
+    """
+    Run a sharded ranking with local processes standing in for the nodes:
+    run_ranking.py --shard I/N for every shard in parallel, then
+    merge_shards.py. With --verify, also run a single-node ranking and check
+    that both outputs are byte-identical.
+
+    Arguments not listed below (e.g. --dedup, --no_cache, --max_side) are
+    passed to every run_ranking.py process.
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input_dir', required=True)
+    parser.add_argument('--num_shards', type=int, default=4)
+    parser.add_argument('--shard_by', choices=['hash', 'range'], default='hash')
+    parser.add_argument('--shard_dir', default=None, help='default: a temporary directory')
+    parser.add_argument('--output', default=None)
+    parser.add_argument('--verify', action='store_true')
+    args, passthrough = parser.parse_known_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shard_dir = args.shard_dir or os.path.join(tmp, 'shards')
+        output = args.output or os.path.join(tmp, 'merged.csv')
+        base = [sys.executable, os.path.join(SCRIPTS, 'run_ranking.py'), '--input_dir', args.input_dir] + passthrough
+        procs = [subprocess.Popen(base + ['--shard', f"{i}/{args.num_shards}", '--shard_by', args.shard_by,
+                                          '--shard_dir', shard_dir])
+                 for i in range(args.num_shards)]
+        failed = [i for i, p in enumerate(procs) if p.wait() != 0]
+        if failed:
+            logger.error(f"Shards {failed} failed")
+            sys.exit(1)
+        subprocess.run([sys.executable, os.path.join(SCRIPTS, 'merge_shards.py'), '--shard_dir', shard_dir,
+                        '--output', output], check=True)
+
+        if args.verify:
+            # written next to the shards, not over the user's ./output/csvs/<input folder>.csv
+            single = os.path.join(tmp, 'reference.csv')
+            subprocess.run(base + ['--output_path', single], check=True, stdout=subprocess.DEVNULL)
+            same = filecmp.cmp(single, output, shallow=False)
+            print(f"merged ({args.num_shards} shards, {args.shard_by}) vs single node: "
+                  f"{'identical' if same else 'DIFFERENT'}")
+            if not same:
+                sys.exit(1)
+
+if __name__ == '__main__':
+    main()
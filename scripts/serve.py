@@ -0,0 +1,112 @@
+import argparse, json, os, socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.config import working_resolution, face_mode
+from features.aesthetic import CLIPAestheticExtractor
+from features.technical import TechnicalFeatureExtractor
+from ranking.fusion import FeatureFusion, FeatureStats
+from service.scoring_service import ScoringService
+from utils.logging import get_logger
+from utils.metrics import METRICS
+
+logger = get_logger(__name__)
+
+class ScoreHandler(BaseHTTPRequestHandler):
+    """
+    POST /score  {"paths": [...], "sort": true}  -> {"results": [...], "errors": {...}, "latency_ms": ...}
+    GET  /health                                  -> {"status": "ok", "batches": ...}
+    GET  /metrics                                 -> stage latencies, counters, queue depth (Prometheus text)
+    """
+    service = None
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, {'status': 'ok', 'batches': self.service.batches})
+        elif self.path == '/metrics':
+            body = METRICS.to_prometheus().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path != '/score':
+            self._reply(404, {'error': 'not found'})
+            return
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            paths = request['paths']
+            if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+                raise ValueError("'paths' must be a list of strings")
+        except Exception as e:
+            self._reply(400, {'error': f"invalid request: {e}"})
+            return
+        try:
+            result = self.service.score(paths)
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+            return
+        if request.get('sort', True):
+            result['results'].sort(key=lambda r: r['final_score'], reverse=True)
+        self._reply(200, result)
+
+    def address_string(self):
+        # unix sockets have no client address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix_socket', default=None, help='serve on a unix socket instead of TCP')
+    parser.add_argument('--stats', default=None, help='normalization stats from run_ranking.py --save_stats')
+    parser.add_argument('--device', default='cpu')
+    parser.add_argument('--max_side', type=int, default=working_resolution)
+    parser.add_argument('--face_mode', choices=['exhaustive', 'fast'], default=face_mode)
+    parser.add_argument('--max_batch', type=int, default=32)
+    parser.add_argument('--max_wait_ms', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    stats = FeatureStats.load(args.stats) if args.stats else None
+    service = ScoringService(
+        CLIPAestheticExtractor(device=args.device, max_side=args.max_side),
+        TechnicalFeatureExtractor(max_side=args.max_side, face_mode=args.face_mode),
+        FeatureFusion(), stats=stats,
+        max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, workers=args.workers).start()
+    ScoreHandler.service = service
+
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.unlink(args.unix_socket)
+        server = UnixHTTPServer(args.unix_socket, ScoreHandler)
+        logger.info(f"Scoring service listening on unix:{args.unix_socket}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), ScoreHandler)
+        logger.info(f"Scoring service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from ranking.fusion import FeatureFusion
+from ranking.table import FeatureTable
+from utils.logging import get_logger
+from utils.metrics import METRICS
+
+logger = get_logger(__name__)
+
+class _Request:
+    """One scoring request; completes when every image in it is processed."""
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self.rows = [None] * len(self.paths)
+        self.errors = {}
+        self.completed = set()  # indices already done; completing one again is a no-op
+        self.remaining = len(self.paths)
+        self.lock = threading.Lock()
+        self.future = Future()
+        self.created = time.perf_counter()
+
+class ScoringService:
+    """
+    Resident scorer: extractors are loaded once and concurrent requests are
+    micro-batched through CLIP.
+
+    A batcher thread takes images from all pending requests until max_batch
+    images are collected or max_wait_ms has passed since the first one,
+    decodes them and computes technical features on a thread pool, scores
+    them with one CLIP forward pass, and completes each request once all its
+    images are done. Scores are fused against stored normalization stats
+    (e.g. from run_ranking.py --save_stats) so they are comparable across
+    requests; without stats each request is normalized on its own, as a
+    run_ranking.py run over the same images would be.
+
+    Args:
+        aesthetic_extractor (CLIPAestheticExtractor)
+        technical_extractor (TechnicalFeatureExtractor)
+        fusion (FeatureFusion)
+        stats (FeatureStats): optional global normalization bounds
+        max_batch (int): images per CLIP forward pass
+        max_wait_ms (float): deadline for filling a batch
+        workers (int): decode/technical threads
+    """
+    def __init__(self, aesthetic_extractor, technical_extractor, fusion=None, stats=None,
+                 max_batch=32, max_wait_ms=10, workers=4):
+        self.aesthetic_extractor = aesthetic_extractor
+        self.technical_extractor = technical_extractor
+        self.fusion = fusion or FeatureFusion()
+        self.stats = stats
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        self.items = queue.Queue()
+        self.batches = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name='scoring-batcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.items.put(None)
+        self._thread.join()
+        self.pool.shutdown()
+
+    def submit(self, paths):
+        """
+        Queue paths for scoring.
+
+        Returns:
+            concurrent.futures.Future: resolves to {'results': [...], 'errors': {...}}
+        """
+        request = _Request(paths)
+        if not request.paths:
+            request.future.set_result({'results': [], 'errors': {}})
+        for i in range(len(request.paths)):
+            self.items.put((request, i))
+        return request.future
+
+    def score(self, paths, timeout=None):
+        """Blocking submit()."""
+        return self.submit(paths).result(timeout)
+
+    # batcher --------------------------------------------------------------
+
+    def _collect(self):
+        METRICS.gauge('service.queue_depth', self.items.qsize())
+        item = self.items.get()
+        if item is None:
+            return []
+        batch = [item]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self.items.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._stop.set()
+                break
+            batch.append(item)
+        return batch
+
+    def _prepare(self, path):
+        decoded = self.technical_extractor.decode(path)
+        features = self.technical_extractor.extract(decoded)
+        with self.aesthetic_extractor.stage('preprocess'):
+            return self.aesthetic_extractor.preprocess(decoded.pil), features
+
+    def _loop(self):
+        while not self._stop.is_set():
+            batch = self._collect()
+            if batch:
+                try:
+                    self._process(batch)
+                except Exception as e:
+                    logger.exception("Scoring batch failed")
+                    # fails only the items _process had not completed yet
+                    for request, i in batch:
+                        self._done(request, i, None, str(e))
+
+    def _process(self, batch):
+        self.batches += 1
+        futures = [self.pool.submit(self._prepare, request.paths[i]) for request, i in batch]
+        ready, inputs = [], []
+        for (request, i), fut in zip(batch, futures):
+            try:
+                clip_input, features = fut.result()
+                ready.append((request, i, features))
+                inputs.append(clip_input)
+            except Exception as e:
+                logger.error(f"Feature extraction failed for {request.paths[i]}: {e}")
+                self._done(request, i, None, str(e))
+        if not inputs:
+            return
+        scores = self.aesthetic_extractor.score_preprocessed(inputs, [r.paths[i] for r, i, _ in ready])
+        for (request, i, features), score in zip(ready, scores):
+            features['aesthetic'] = float(score)
+            self._done(request, i, features, None)
+
+    def _done(self, request, i, features, error):
+        with request.lock:
+            if i in request.completed:
+                return
+            request.completed.add(i)
+            if features is not None:
+                features['path'] = request.paths[i]
+                features['file'] = request.paths[i].split('/')[-1]
+                request.rows[i] = features
+            else:
+                request.errors[request.paths[i]] = error
+            request.remaining -= 1
+            finished = request.remaining == 0
+        if finished:
+            try:
+                self._finish(request)
+            except Exception as e:
+                logger.exception("Finishing a scoring request failed")
+                if not request.future.done():
+                    request.future.set_exception(RuntimeError(f"Scoring request failed: {e}"))
+
+    def _finish(self, request):
+        rows = [r for r in request.rows if r is not None]
+        results = []
+        if rows:
+            table = FeatureTable.from_dicts(
+                rows, columns=['file', 'path', 'aesthetic', 'sharpness', 'exposure', 'contrast', 'faces'])
+            with METRICS.timer('fusion'):
+                self.fusion.fuse_table(table, self.stats, clip=self.stats is not None)
+            results = table.to_dicts()
+        METRICS.inc('service.failures', len(request.errors))
+        METRICS.observe('service.request', time.perf_counter() - request.created)
+        request.future.set_result({
+            'results': results,
+            'errors': request.errors,
+            'latency_ms': 1000 * (time.perf_counter() - request.created)
+        })
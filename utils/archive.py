@@ -0,0 +1,137 @@
+import os
+import tarfile
+import zipfile
+from functools import lru_cache
+from utils.io import IMAGE_EXTS, ARCHIVE_SEP, ImageBuffer
+
+# uncompressed tar and zip only: members must be readable by offset
+# (read_member), which compressed tars cannot do without decompressing
+# the shard up to each member
+ARCHIVE_EXTS = ('.tar', '.zip')
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTS)
+
+def archive_ref(shard, member):
+    """Reference to one image inside a shard, as written to the ranking CSV."""
+    return f"{shard}{ARCHIVE_SEP}{member}"
+
+def split_archive_ref(ref):
+    """'shard.tar::dir/img.jpg' -> ('shard.tar', 'dir/img.jpg')."""
+    shard, member = ref.split(ARCHIVE_SEP, 1)
+    return shard, member
+
+def _check_format(shard):
+    if not is_archive(shard):
+        raise ValueError(f"Unsupported archive {shard}: expected an uncompressed {' or '.join(ARCHIVE_EXTS)} shard "
+                         f"(see scripts/pack_shards.py)")
+
+def find_archives(paths):
+    """Expand shard files and directories of shards into a sorted list of shard paths."""
+    shards = []
+    for path in paths:
+        if os.path.isdir(path):
+            shards.extend(sorted(os.path.join(path, n) for n in os.listdir(path) if is_archive(n)))
+        else:
+            shards.append(path)
+    return shards
+
+def _zip_images(zf, exts):
+    # storage order, so reads move forward through the file
+    infos = [i for i in zf.infolist() if not i.is_dir() and i.filename.lower().endswith(exts)]
+    return sorted(infos, key=lambda i: i.header_offset)
+
+def list_archive(shard, exts=IMAGE_EXTS):
+    """
+    Image member references of a shard, in the order iter_archive yields them.
+    Only headers are read.
+    """
+    _check_format(shard)
+    if shard.lower().endswith('.zip'):
+        with zipfile.ZipFile(shard) as zf:
+            return [archive_ref(shard, i.filename) for i in _zip_images(zf, exts)]
+    with tarfile.open(shard, 'r:') as tf:
+        return [archive_ref(shard, m.name) for m in tf if m.isfile() and m.name.lower().endswith(exts)]
+
+def iter_archive(shard, exts=IMAGE_EXTS):
+    """
+    Stream the image members of one shard sequentially as ImageBuffers
+    (reference + encoded bytes), without extracting anything to disk.
+    """
+    _check_format(shard)
+    if shard.lower().endswith('.zip'):
+        with zipfile.ZipFile(shard) as zf:
+            for info in _zip_images(zf, exts):
+                yield ImageBuffer(archive_ref(shard, info.filename), zf.read(info))
+    else:
+        with tarfile.open(shard, 'r|') as tf:  # stream mode: strictly sequential reads
+            for member in tf:
+                if member.isfile() and member.name.lower().endswith(exts):
+                    yield ImageBuffer(archive_ref(shard, member.name), tf.extractfile(member).read())
+
+def iter_archive_images(shards, exts=IMAGE_EXTS):
+    for shard in shards:
+        yield from iter_archive(shard, exts)
+
+@lru_cache(maxsize=256)
+def _tar_index(shard):
+    """member name -> (data offset, size) of an uncompressed tar."""
+    with tarfile.open(shard, 'r:') as tf:
+        return {m.name: (m.offset_data, m.size) for m in tf if m.isfile()}
+
+@lru_cache(maxsize=64)
+def _open_zip(shard, pid):
+    """
+    An open ZipFile per shard and process (its central directory is parsed
+    once); ZipFile serializes concurrent member reads on the shared handle.
+    """
+    return zipfile.ZipFile(shard)
+
+def read_member(ref):
+    """
+    Encoded bytes of one archive member, for random access outside the
+    sequential stream (worker processes, review thumbnails, dedup re-hashing).
+    Tars are indexed and zips opened once per process.
+    """
+    shard, member = split_archive_ref(ref)
+    _check_format(shard)
+    if shard.lower().endswith('.zip'):
+        return _open_zip(shard, os.getpid()).read(member)
+    offset, size = _tar_index(shard)[member]
+    with open(shard, 'rb') as f:
+        f.seek(offset)
+        return f.read(size)
+
+def pack_shards(paths, output_dir, root, fmt='tar', max_bytes=1 << 30, max_files=None, prefix='shard'):
+    """
+    Pack image files into numbered shards of at most max_bytes (and
+    max_files) each. Members are stored uncompressed under their path
+    relative to root; JPEG/PNG do not compress further.
+
+    Returns:
+        list of str: shard paths written
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shards, archive, size, count = [], None, 0, 0
+
+    def close():
+        if archive is not None:
+            archive.close()
+
+    for path in paths:
+        file_size = os.path.getsize(path)
+        if archive is None or (size and size + file_size > max_bytes) or (max_files and count >= max_files):
+            close()
+            shard = os.path.join(output_dir, f"{prefix}-{len(shards):06d}.{fmt}")
+            archive = zipfile.ZipFile(shard, 'w', zipfile.ZIP_STORED) if fmt == 'zip' else tarfile.open(shard, 'w')
+            shards.append(shard)
+            size, count = 0, 0
+        arcname = os.path.relpath(path, root).replace(os.sep, '/')
+        if fmt == 'zip':
+            archive.write(path, arcname)
+        else:
+            archive.add(path, arcname, recursive=False)
+        size += file_size
+        count += 1
+    close()
+    return shards
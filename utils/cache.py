@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from utils.logging import get_logger
+from utils.metrics import METRICS
+
+logger = get_logger(__name__)
+
+def feature_fingerprint(*parts):
+    """
+    Stable hash of everything that affects extracted features (model name,
+    prompts, extractor versions). Cached rows with another fingerprint are stale.
+    """
+    blob = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+class FeatureCache:
+    """
+    Persistent SQLite store of raw per-image features.
+
+    Rows are keyed by path and validated against the file's size and mtime and
+    the extractor fingerprint, so re-runs only compute new or changed images.
+    Rows from another fingerprint are dropped on open, and the store is kept
+    under max_bytes by evicting the least recently used rows.
+
+    Args:
+        db_path (str): SQLite file
+        fingerprint (str): see feature_fingerprint
+        max_bytes (int): optional size budget for stored feature payloads
+    """
+    _QUERY_CHUNK = 500
+
+    def __init__(self, db_path, fingerprint, max_bytes=None):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.fingerprint = fingerprint
+        self.max_bytes = max_bytes
+        # WAL and a generous busy timeout: concurrent runs (e.g. local shard
+        # processes) share one cache file and serialize only their writes
+        self.conn = sqlite3.connect(db_path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS features ("
+            " path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+            " fingerprint TEXT, payload TEXT, nbytes INTEGER, last_used REAL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON features(last_used)")
+        stale = self.conn.execute(
+            "DELETE FROM features WHERE fingerprint != ?", (fingerprint,)).rowcount
+        self.conn.commit()
+        if stale:
+            logger.info(f"Feature cache: dropped {stale} rows from a previous model/prompt configuration")
+
+    @staticmethod
+    def _stat(path):
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def lookup(self, paths):
+        """
+        Split paths into cached hits and paths that must be (re)computed.
+
+        Returns:
+            tuple: (hits, misses) where hits maps path -> feature dict and
+            misses is a list of paths in input order.
+        """
+        paths = list(paths)
+        rows = {}
+        for i in range(0, len(paths), self._QUERY_CHUNK):
+            chunk = paths[i:i + self._QUERY_CHUNK]
+            marks = ','.join('?' * len(chunk))
+            for path, size, mtime_ns, payload in self.conn.execute(
+                    f"SELECT path, size, mtime_ns, payload FROM features WHERE path IN ({marks})", chunk):
+                rows[path] = (size, mtime_ns, payload)
+
+        hits, misses = {}, []
+        for path in paths:
+            row = rows.get(path)
+            try:
+                if row is not None and row[:2] == self._stat(path):
+                    hits[path] = json.loads(row[2])
+                    continue
+            except OSError:
+                pass
+            misses.append(path)
+
+        now = time.time()
+        self.conn.executemany("UPDATE features SET last_used = ? WHERE path = ?",
+                              [(now, p) for p in hits])
+        self.conn.commit()
+        METRICS.inc('cache.hits', len(hits))
+        METRICS.inc('cache.misses', len(misses))
+        logger.info(f"Feature cache: {len(hits)} hits, {len(misses)} misses")
+        return hits, misses
+
+    def put_many(self, items):
+        """
+        Store raw features.
+
+        Args:
+            items (iterable): (path, feature dict) pairs
+        """
+        now = time.time()
+        rows = []
+        for path, features in items:
+            try:
+                size, mtime_ns = self._stat(path)
+            except OSError:
+                continue
+            payload = json.dumps(features)
+            rows.append((path, size, mtime_ns, self.fingerprint, payload, len(payload), now))
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used rows until the payload total fits max_bytes."""
+        if not self.max_bytes:
+            return 0
+        total = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM features").fetchone()[0]
+        if total <= self.max_bytes:
+            return 0
+        victims = []
+        for path, nbytes in self.conn.execute(
+                "SELECT path, nbytes FROM features ORDER BY last_used ASC"):
+            if total <= self.max_bytes:
+                break
+            victims.append((path,))
+            total -= nbytes
+        self.conn.executemany("DELETE FROM features WHERE path = ?", victims)
+        self.conn.commit()
+        logger.info(f"Feature cache: evicted {len(victims)} rows")
+        return len(victims)
+
+    def close(self):
+        self.conn.close()
@@ -1,16 +1,103 @@
+import io
 import os
 import csv
+from collections import namedtuple
+import numpy as np
 from PIL import Image
+from utils.logging import get_logger
 
-def load_images_from_folder(folder_path, exts=('.jpg','.jpeg','.png')):
+logger = get_logger(__name__)
+
+IMAGE_EXTS = ('.jpg','.jpeg','.png')
+ARCHIVE_SEP = '::'
+MANIFEST_HEADER = '# image-manifest v1: path<TAB>size<TAB>mtime_ns'
+
+ImageEntry = namedtuple('ImageEntry', ['path', 'size', 'mtime_ns'])
+# encoded image bytes read from an archive shard (see utils.archive); path is 'shard::member'
+ImageBuffer = namedtuple('ImageBuffer', ['path', 'data'])
+
+def iter_image_entries(folder_path, exts=IMAGE_EXTS, recursive=True):
+    """
+    Walk a folder with os.scandir and yield an ImageEntry per image, in sorted
+    order within each directory. Stat results come from the directory entries,
+    so each file is stat'ed at most once and nothing is listed up front.
+
+    Raises:
+        OSError if folder_path itself cannot be listed; unreadable
+        subdirectories are skipped with a warning.
+    """
+    stack = [folder_path]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError as e:
+            if directory == folder_path:
+                raise
+            logger.warning(f"Skipping unreadable directory {directory}: {e}")
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        subdirs.append(entry.path)
+                elif entry.name.lower().endswith(exts):
+                    st = entry.stat()
+                    yield ImageEntry(entry.path, st.st_size, st.st_mtime_ns)
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+def load_images_from_folder(folder_path, exts=IMAGE_EXTS, recursive=False):
+    """
+    Load all image paths from a folder (and its subfolders if recursive) with supported extensions.
+    """
+    return sorted(e.path for e in iter_image_entries(folder_path, exts, recursive))
+
+def write_manifest(manifest_path, entries):
+    """
+    Write ImageEntry rows to a manifest file so later runs can skip walking.
+
+    Returns:
+        int: number of entries written
     """
-    Load all image paths from a folder with supported extensions.
+    tmp = manifest_path + '.tmp'
+    n = 0
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(MANIFEST_HEADER + '\n')
+        for e in entries:
+            f.write(f"{e.path}\t{e.size}\t{e.mtime_ns}\n")
+            n += 1
+    os.replace(tmp, manifest_path)
+    return n
+
+def read_manifest(manifest_path):
+    """Yield the ImageEntry rows of a manifest file."""
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            path, size, mtime_ns = line.rstrip('\n').rsplit('\t', 2)
+            yield ImageEntry(path, int(size), int(mtime_ns))
+
+def manifest_delta(old_manifest_path, entries):
     """
-    images = []
-    for fname in os.listdir(folder_path):
-        if fname.lower().endswith(exts):
-            images.append(os.path.join(folder_path, fname))
-    return sorted(images)
+    Compare current entries against a previous manifest.
+
+    Returns:
+        dict: {'added': [...], 'changed': [...], 'removed': [...]} lists of paths
+    """
+    old = {e.path: (e.size, e.mtime_ns) for e in read_manifest(old_manifest_path)}
+    added, changed = [], []
+    for e in entries:
+        prev = old.pop(e.path, None)
+        if prev is None:
+            added.append(e.path)
+        elif prev != (e.size, e.mtime_ns):
+            changed.append(e.path)
+    return {'added': added, 'changed': changed, 'removed': sorted(old)}
 
 def save_csv(output_path, rows, fieldnames):
     with open(output_path, 'w', newline='', encoding='utf-8') as f:
@@ -19,12 +106,99 @@ def save_csv(output_path, rows, fieldnames):
         for row in rows:
             writer.writerow({k: row.get(k,'') for k in fieldnames})
 
-def load_image_pil(path):
+def is_archive_ref(path):
+    """
+    True if path refers to a member of an archive shard ('shard.tar::member.jpg').
+    A '::' alone is not enough: it is legal in file names, so the part before
+    it must also be an existing .tar or .zip file.
+    """
+    if ARCHIVE_SEP not in path:
+        return False
+    from utils.archive import is_archive
+    shard = path.split(ARCHIVE_SEP, 1)[0]
+    return is_archive(shard) and os.path.isfile(shard)
+
+def load_image_pil(path, max_side=None):
     """
     Load PIL image, handle exceptions.
+
+    path may also be an archive member reference ('shard.tar::member.jpg')
+    or an ImageBuffer holding the encoded bytes.
+
+    With max_side, JPEGs are decoded with DCT scaling (draft mode) to the
+    smallest scale at least max_side on each axis, and the result is bounded
+    to max_side on its long side.
     """
-    from PIL import Image
     try:
-        return Image.open(path).convert('RGB')
+        if isinstance(path, ImageBuffer):
+            img = Image.open(io.BytesIO(path.data))
+        elif is_archive_ref(path):
+            from utils.archive import read_member
+            img = Image.open(io.BytesIO(read_member(path)))
+        else:
+            img = Image.open(path)
+        if max_side:
+            img.draft('RGB', (max_side, max_side))  # no-op for non-JPEG
+            img = img.convert('RGB')
+            img.thumbnail((max_side, max_side), Image.BILINEAR)
+            return img
+        return img.convert('RGB')
     except Exception as e:
-        raise IOError(f"Failed to load image {path}: {e}")
\ No newline at end of file
+        raise IOError(f"Failed to load image {image_path(path)}: {e}")
+
+class DecodedImage:
+    """
+    An image decoded once and shared by every consumer (CLIP preprocess,
+    technical features, pHash).
+
+    Attributes:
+        path (str): source path
+        pil (PIL.Image): decoded RGB image
+        rgb (np.ndarray): HxWx3 uint8 array, built once on first access
+        gray (np.ndarray): HxW uint8 array, built once on first access
+    """
+    __slots__ = ('path', 'pil', '_rgb', '_gray')
+
+    def __init__(self, path, pil):
+        self.path = path
+        self.pil = pil
+        self._rgb = None
+        self._gray = None
+
+    @classmethod
+    def from_path(cls, path, max_side=None):
+        return cls(image_path(path), load_image_pil(path, max_side))
+
+    @property
+    def rgb(self):
+        if self._rgb is None:
+            self._rgb = np.asarray(self.pil)
+        return self._rgb
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            import cv2
+            self._gray = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2GRAY)
+        return self._gray
+
+    @property
+    def gray_pil(self):
+        """'L' image over the gray buffer (no copy)."""
+        return Image.fromarray(self.gray)
+
+def load_decoded(image, max_side=None):
+    """
+    Return a DecodedImage for a path or ImageBuffer (bounded to max_side if
+    given), or the image itself if already decoded.
+    """
+    if isinstance(image, DecodedImage):
+        return image
+    return DecodedImage.from_path(image, max_side)
+
+def image_path(image):
+    """
+    Source path (or archive ref) of a path, DecodedImage or ImageBuffer, for
+    logging and output rows.
+    """
+    return image.path if isinstance(image, (DecodedImage, ImageBuffer)) else image
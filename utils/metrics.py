@@ -0,0 +1,156 @@
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+# latency bucket upper bounds in seconds (Prometheus convention)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Fixed-bucket latency histogram; cheap to update and to merge."""
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q):
+        """Upper bucket bound containing the q-th observation (max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def merge(self, other):
+        if other['buckets'] != list(self.buckets):
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other['counts'])]
+        self.count += other['count']
+        self.sum += other['sum']
+        self.max = max(self.max, other['max'])
+
+    def to_dict(self):
+        return {'buckets': list(self.buckets), 'counts': list(self.counts), 'count': self.count,
+                'sum': self.sum, 'max': self.max, 'mean': self.sum / self.count if self.count else 0.0,
+                'p50': self.quantile(0.5), 'p95': self.quantile(0.95), 'p99': self.quantile(0.99)}
+
+class Metrics:
+    """
+    Thread-safe registry of per-stage latency histograms, event counters and
+    gauges (e.g. queue depths, keeping the last and the maximum value).
+
+    Stage and counter names are dotted, e.g. 'technical.faces' or 'cache.hits'.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = Histogram()
+            hist.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """Time the enclosed block into the stage histogram (also when it raises)."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def inc(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self._lock:
+            last, peak = self.gauges.get(name, (0, value))
+            self.gauges[name] = (value, max(peak, value))
+
+    def to_dict(self):
+        with self._lock:
+            return {'stages': {k: h.to_dict() for k, h in sorted(self.stages.items())},
+                    'counters': dict(sorted(self.counters.items())),
+                    'gauges': {k: {'last': v, 'max': m} for k, (v, m) in sorted(self.gauges.items())}}
+
+    def drain(self):
+        """Snapshot and reset, e.g. to ship a worker process's metrics to the parent."""
+        snapshot = self.to_dict()
+        self.reset()
+        return snapshot
+
+    def merge(self, snapshot):
+        """Add a to_dict() snapshot from another process into this registry."""
+        with self._lock:
+            for stage, h in snapshot['stages'].items():
+                hist = self.stages.get(stage)
+                if hist is None:
+                    hist = self.stages[stage] = Histogram(h['buckets'])
+                hist.merge(h)
+            for name, n in snapshot['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + n
+            for name, g in snapshot['gauges'].items():
+                last, peak = self.gauges.get(name, (g['last'], g['max']))
+                self.gauges[name] = (g['last'], max(peak, g['max']))
+
+    def save_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def save_prometheus(self, path, prefix='iqc'):
+        """Write to_prometheus() to a file (e.g. for the node_exporter textfile collector)."""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus(prefix))
+
+    def to_prometheus(self, prefix='iqc'):
+        """The registry in the Prometheus text exposition format."""
+        data = self.to_dict()
+        lines = [f"# TYPE {prefix}_stage_seconds histogram"]
+        for stage, h in data['stages'].items():
+            cumulative = 0
+            for bound, n in zip(h['buckets'] + ['+Inf'], h['counts']):
+                cumulative += n
+                lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {h["sum"]:.6f}')
+            lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {h["count"]}')
+        lines.append(f"# TYPE {prefix}_events_total counter")
+        for name, n in data['counters'].items():
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {n}')
+        for suffix, field in (('gauge', 'last'), ('gauge_max', 'max')):
+            lines.append(f"# TYPE {prefix}_{suffix} gauge")
+            for name, g in data['gauges'].items():
+                lines.append(f'{prefix}_{suffix}{{name="{name}"}} {g[field]}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """One line per stage: count, mean and p95 in milliseconds."""
+        lines = []
+        for stage, h in self.to_dict()['stages'].items():
+            lines.append(f"{stage:>24}: n={h['count']:<7} mean={h['mean'] * 1000:8.2f} ms  "
+                         f"p95<={h['p95'] * 1000:8.2f} ms  total={h['sum']:8.2f} s")
+        return '\n'.join(lines)
+
+# process-wide registry used by extractors and pipelines
+METRICS = Metrics()
@@ -0,0 +1,249 @@
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from utils.io import image_path
+from utils.logging import get_logger
+from utils.metrics import METRICS
+
+logger = get_logger(__name__)
+
+# per-process state, set up once by _init_worker
+_worker = {}
+
+def memory_mb():
+    """
+    This process's resident memory in MB: 'rss', and on Linux 'pss' (shared
+    pages divided among the processes mapping them, so worker PSS values add
+    up to the real footprint) and 'shared'.
+    """
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = {line.split(':')[0]: int(line.split()[1]) for line in f if line.endswith('kB\n')}
+        return {'rss': fields['Rss'] / 1024, 'pss': fields['Pss'] / 1024,
+                'shared': (fields['Shared_Clean'] + fields['Shared_Dirty']) / 1024}
+    except (OSError, KeyError):
+        import resource
+        return {'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+def _init_worker(preprocess, phash, max_side, face_mode):
+    import cv2
+    from features.technical import TechnicalFeatureExtractor
+    from ranking.dedup import Deduplicator
+    cv2.setNumThreads(1)  # one process per core; avoid oversubscription
+    _worker['technical'] = TechnicalFeatureExtractor(max_side=max_side, face_mode=face_mode)
+    _worker['preprocess'] = preprocess
+    _worker['dedup'] = Deduplicator() if phash else None
+
+def _process_chunk(paths):
+    """
+    Runs in a worker: decode each image once, compute technical features,
+    the pHash if requested and, if a CLIP preprocess was given, the
+    preprocessed input tensor.
+
+    Returns:
+        tuple: (results, metrics) where results holds (path, features,
+        clip_input, error) per path and metrics is this worker's
+        utils.metrics snapshot since its previous chunk
+    """
+    results = []
+    for path in paths:
+        try:
+            decoded = _worker['technical'].decode(path)
+            features = _worker['technical'].extract(decoded)
+            if _worker['dedup'] is not None:
+                features['phash'] = _worker['dedup'].hash_image(decoded)
+            clip_input = None
+            if _worker['preprocess'] is not None:
+                with METRICS.timer('clip.preprocess'):
+                    clip_input = _worker['preprocess'](decoded.pil).numpy()
+            results.append((path, features, clip_input, None))
+        except Exception as e:
+            METRICS.inc('worker.failures')
+            results.append((path, None, None, str(e)))
+    return results, METRICS.drain()
+
+class TechnicalPool:
+    """
+    Process pool that decodes images and computes technical features off the
+    main process, leaving it free for CLIP inference.
+
+    Tasks are submitted in chunks with a bounded number in flight, and results
+    are yielded in input order. Stage metrics recorded in the workers are
+    merged into this process's utils.metrics.METRICS.
+
+    Args:
+        workers (int): number of worker processes
+        preprocess (callable): optional CLIP preprocess run in the workers
+        phash (bool): also compute the dedup pHash from the shared decode
+        max_side (int): working resolution for decoding (None = native)
+        face_mode (str): TechnicalFeatureExtractor face mode
+        chunksize (int): paths per submitted task
+        prefetch (int): chunks in flight per worker
+    """
+    def __init__(self, workers, preprocess=None, phash=False, max_side=None,
+                 chunksize=16, prefetch=2, face_mode='exhaustive'):
+        self.workers = workers
+        self.chunksize = max(1, chunksize)
+        self.max_inflight = max(1, workers * prefetch)
+        # spawn: forking a process that already holds torch/OpenMP threads can deadlock
+        ctx = mp.get_context('spawn')
+        self.pool = ctx.Pool(workers, initializer=_init_worker, initargs=(preprocess, phash, max_side, face_mode))
+
+    def imap(self, paths):
+        """
+        Yields:
+            tuple: (path, features, clip_input, error) per path, in input order.
+            error is None on success, otherwise a message and the rest are None.
+        """
+        paths = list(paths)
+        chunks = (paths[i:i + self.chunksize] for i in range(0, len(paths), self.chunksize))
+        inflight = deque()
+        for chunk in chunks:
+            inflight.append(self.pool.apply_async(_process_chunk, (chunk,)))
+            METRICS.gauge('pool.inflight_chunks', len(inflight))
+            if len(inflight) >= self.max_inflight:
+                yield from self._collect(inflight.popleft())
+        while inflight:
+            yield from self._collect(inflight.popleft())
+
+    @staticmethod
+    def _collect(async_result):
+        results, metrics = async_result.get()
+        METRICS.merge(metrics)
+        return results
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.pool.terminate()
+        return False
+
+def _init_clip_worker(aesthetic, phash, max_side, face_mode, threads):
+    t0 = time.perf_counter()
+    import torch
+    from features.aesthetic import CLIPAestheticExtractor
+    torch.set_num_threads(threads)  # workers split the cores between them
+    if isinstance(aesthetic, dict):
+        # unshared baseline: every worker loads its own model
+        aesthetic = CLIPAestheticExtractor(**aesthetic)
+    _init_worker(None, phash, max_side, face_mode)
+    _worker['aesthetic'] = aesthetic
+    _worker['info'] = {'pid': os.getpid(), 'ready': time.time(), 'init_s': time.perf_counter() - t0}
+
+def _score_chunk(paths):
+    """
+    Runs in a ClipPool worker: decode, technical features, pHash if requested
+    and the CLIP aesthetic score, with one forward pass for the chunk.
+
+    Returns:
+        tuple: (results, metrics, info) where results holds (path, features,
+        error) per path, metrics is this worker's utils.metrics snapshot and
+        info its pid, readiness time and current memory_mb()
+    """
+    technical, dedup = _worker['technical'], _worker['dedup']
+    results = []
+    for batch, aesthetic_batch in _worker['aesthetic'].iter_batches(paths, batch_size=len(paths), num_workers=1):
+        for image, aesthetic in zip(batch, aesthetic_batch):
+            try:
+                if aesthetic is None:
+                    raise RuntimeError("CLIP aesthetic unavailable")
+                features = dict(aesthetic)
+                features.update(technical.extract(image))
+                if dedup is not None:
+                    features['phash'] = dedup.hash_image(image)
+                results.append((image_path(image), features, None))
+            except Exception as e:
+                METRICS.inc('worker.failures')
+                results.append((image_path(image), None, str(e)))
+    return results, METRICS.drain(), dict(_worker['info'], **memory_mb())
+
+class ClipPool(TechnicalPool):
+    """
+    Process pool in which every worker runs the whole extraction, CLIP
+    included, to use all cores for inference.
+
+    The model is loaded once in this process and its parameters and text
+    features are moved to shared memory (CLIPAestheticExtractor.share_memory);
+    workers are spawned through torch.multiprocessing, which hands them the
+    shared storages instead of copies, so N workers hold about one model's
+    weights. With share=False each worker loads its own model instead, as a
+    baseline for the startup and memory numbers.
+
+    worker_info maps each worker pid to its startup time (pool creation to
+    ready, 'startup_s'), initializer time ('init_s') and latest memory_mb().
+
+    Args:
+        workers (int): number of worker processes
+        aesthetic (CLIPAestheticExtractor): loaded extractor without an
+            embedding store; it is moved to shared memory if share is set
+        phash (bool): also compute the dedup pHash
+        max_side (int): working resolution for decoding (None = native)
+        face_mode (str): TechnicalFeatureExtractor face mode
+        threads (int): torch threads per worker (default cores / workers)
+        share (bool): share the parent's weights rather than loading per worker
+        chunksize (int): paths per submitted task (one CLIP forward pass)
+        prefetch (int): chunks in flight per worker
+    """
+    def __init__(self, workers, aesthetic, phash=False, max_side=None, face_mode='exhaustive',
+                 threads=None, share=True, chunksize=16, prefetch=2):
+        import torch.multiprocessing as torch_mp
+        if aesthetic.embedding_store is not None:
+            raise ValueError("ClipPool workers cannot write to an embedding store")
+        self.workers = workers
+        self.chunksize = max(1, chunksize)
+        self.max_inflight = max(1, workers * prefetch)
+        self.worker_info = {}
+        if share:
+            payload = aesthetic.share_memory()
+        else:
+            payload = {'device': aesthetic.device, 'model_name': aesthetic.model_name,
+                       'max_side': aesthetic.max_side, 'cpu_opt': aesthetic.cpu_opt}
+        threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.started = time.time()
+        ctx = torch_mp.get_context('spawn')
+        self.pool = ctx.Pool(workers, initializer=_init_clip_worker,
+                             initargs=(payload, phash, max_side, face_mode, threads))
+
+    def imap(self, paths):
+        """
+        Yields:
+            tuple: (path, features, error) per path, in input order. error is
+            None on success, otherwise a message and features is None.
+        """
+        paths = list(paths)
+        inflight = deque()
+        for i in range(0, len(paths), self.chunksize):
+            inflight.append(self.pool.apply_async(_score_chunk, (paths[i:i + self.chunksize],)))
+            METRICS.gauge('pool.inflight_chunks', len(inflight))
+            if len(inflight) >= self.max_inflight:
+                yield from self._collect(inflight.popleft())
+        while inflight:
+            yield from self._collect(inflight.popleft())
+
+    def _collect(self, async_result):
+        results, metrics, info = async_result.get()
+        METRICS.merge(metrics)
+        if info['pid'] not in self.worker_info:
+            METRICS.observe('clip_pool.worker_startup', info['ready'] - self.started)
+        self.worker_info[info['pid']] = dict(info, startup_s=info['ready'] - self.started)
+        METRICS.gauge('clip_pool.worker_pss_mb', info.get('pss', info['rss']))
+        return results
+
+    def memory_summary(self):
+        """Per-worker startup and memory, and the workers' summed PSS, as log lines."""
+        lines = []
+        for pid, info in sorted(self.worker_info.items()):
+            lines.append(f"worker {pid}: startup {info['startup_s']:.2f} s (init {info['init_s']:.2f} s), "
+                         f"rss {info['rss']:.0f} MB" + (f", pss {info['pss']:.0f} MB" if 'pss' in info else ''))
+        if self.worker_info and all('pss' in i for i in self.worker_info.values()):
+            lines.append(f"workers total pss {sum(i['pss'] for i in self.worker_info.values()):.0f} MB")
+        return lines